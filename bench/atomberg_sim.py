@@ -0,0 +1,316 @@
+# atomberg_sim.py
+"""Local stand-in for the Atomberg cloud API, for load tests without real quota.
+
+Run it on its own and point the bridge at it:
+
+    python -m bench.atomberg_sim --port 8100 --devices 5000 --latency lognormal:120:0.5 --error-rate 0.01
+    ATOMBERG_BASE_URL=http://127.0.0.1:8100/v1 uvicorn server:app
+
+Implements /get_access_token, /get_list_of_devices, /get_device_state and
+/send_command with fan state transitions, token expiry, per-key and per-device
+throttling, random upstream errors and configurable latency distributions.
+GET /sim/stats reports what the simulator has seen.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+DEFAULT_DEVICE_ID = "f09e9ef2b640"
+ROOMS = ["Bedroom", "Hall", "Kitchen", "Study", "Guest Room", "Dining"]
+# send_command timer values and the hours they stand for
+TIMER_HOURS = {0: 0, 1: 1, 2: 2, 3: 3, 4: 6}
+
+def parse_latency(spec: str):
+    """Build a sampler returning milliseconds from a spec such as
+
+    fixed:100, uniform:50:200, normal:120:30, lognormal:120:0.5 (median, sigma)
+    """
+    kind, *values = spec.split(":")
+    values = [float(value) for value in values]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: random.lognormvariate(0.0, sigma) * median
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+def _fake_jwt(payload: dict) -> str:
+    def encode(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode(payload)}.sim"
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class AtombergSimulator:
+    """Simulated fleet of fans behind the Atomberg developer API"""
+
+    def __init__(
+        self,
+        devices: int = 1,
+        latency: str = "fixed:0",
+        error_rate: float = 0.0,
+        offline_rate: float = 0.0,
+        rate_limit: float = 0.0,
+        burst: float = 10.0,
+        device_gap: float = 0.0,
+        token_ttl: float = 24 * 3600,
+        daily_limit: int = 0,
+        seed: int = None
+    ):
+        self.random = random.Random(seed)
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.device_gap = device_gap
+        self.token_ttl = token_ttl
+        self.daily_limit = daily_limit
+        self.stats = Counter()
+        self._buckets = {}  # api key -> TokenBucket
+        self._last_command = {}  # device_id -> monotonic time
+        self._tokens = {}  # access token -> expiry (wall clock)
+        self.devices = {}
+        self.states = {}
+        for index in range(devices):
+            device_id = DEFAULT_DEVICE_ID if index == 0 else f"{self.random.getrandbits(48):012x}"
+            self.devices[device_id] = {
+                "device_id": device_id,
+                "name": f"Atom Fan {index + 1}",
+                "room": ROOMS[index % len(ROOMS)],
+                "model": "renesa",
+                "series": "R1",
+                "color": "white"
+            }
+            self.states[device_id] = {
+                "device_id": device_id,
+                "is_online": self.random.random() >= offline_rate,
+                "power": False,
+                "led": False,
+                "sleep_mode": False,
+                "last_recorded_speed": self.random.randint(1, 6),
+                "timer_hours": 0,
+                "timer_time_elapsed_mins": 0,
+                "ts_epoch_seconds": int(time.time()),
+                "last_recorded_brightness": 100,
+                "last_recorded_color": "daylight"
+            }
+        self._timer_started = {}  # device_id -> wall clock
+
+    def _advance(self, state: dict):
+        """Run the fan timer forward to now, switching the fan off when it lapses"""
+        started = self._timer_started.get(state["device_id"])
+        if not started or not state["timer_hours"]:
+            return
+        elapsed_mins = int((time.time() - started) / 60)
+        state["timer_time_elapsed_mins"] = elapsed_mins
+        if elapsed_mins >= TIMER_HOURS[state["timer_hours"]] * 60:
+            state.update(power=False, timer_hours=0, timer_time_elapsed_mins=0)
+            self._timer_started.pop(state["device_id"], None)
+
+    def apply_command(self, state: dict, command: dict):
+        """Fan behaviour for each send_command key"""
+        device_id = state["device_id"]
+        for key, value in command.items():
+            if key == "power":
+                state["power"] = bool(value)
+                if not value:
+                    state.update(sleep_mode=False, timer_hours=0, timer_time_elapsed_mins=0)
+                    self._timer_started.pop(device_id, None)
+            elif key == "speed":
+                # Setting a speed also starts the motor
+                state.update(last_recorded_speed=int(value), power=True, sleep_mode=False)
+            elif key == "sleep":
+                state["sleep_mode"] = bool(value)
+                if value:
+                    state["power"] = True
+            elif key == "timer":
+                state.update(timer_hours=int(value), timer_time_elapsed_mins=0)
+                if value:
+                    state["power"] = True
+                    self._timer_started[device_id] = time.time()
+                else:
+                    self._timer_started.pop(device_id, None)
+            elif key == "led":
+                state["led"] = bool(value)
+            elif key == "brightness":
+                state.update(last_recorded_brightness=int(value), led=True)
+            elif key == "light_mode":
+                state.update(last_recorded_color=str(value), led=True)
+        state["ts_epoch_seconds"] = int(time.time())
+
+    def _validate_command(self, command: dict):
+        ranges = {"speed": (1, 6), "timer": (0, 4), "brightness": (10, 100)}
+        for key, value in command.items():
+            if key in ("power", "sleep", "led"):
+                if not isinstance(value, bool):
+                    return f"{key} must be a boolean"
+            elif key in ranges:
+                low, high = ranges[key]
+                if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+                    return f"{key} must be between {low} and {high}"
+            elif key == "light_mode":
+                if value not in ("cool", "warm", "daylight"):
+                    return "light_mode must be cool, warm or daylight"
+            else:
+                return f"Unknown command {key}"
+        return None
+
+    async def _gate(self, request: Request, endpoint: str, needs_access_token: bool = True):
+        """Latency, auth, throttling and random failures shared by every endpoint"""
+        self.stats[endpoint] += 1
+        self.stats["requests"] += 1
+        await asyncio.sleep(self.latency() / 1000)
+
+        api_key = request.headers.get("x-api-key")
+        bearer = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not api_key or not bearer:
+            self.stats["unauthorized"] += 1
+            return JSONResponse({"status": "Failure", "message": "Missing credentials"}, status_code=401)
+        if needs_access_token and self._tokens.get(bearer, 0) < time.time():
+            self.stats["unauthorized"] += 1
+            return JSONResponse({"status": "Failure", "message": "Invalid or expired access token"}, status_code=401)
+
+        if self.daily_limit and self.stats["requests"] > self.daily_limit:
+            self.stats["throttled"] += 1
+            return JSONResponse({"status": "Failure", "message": "Daily limit exceeded"}, status_code=429)
+        if self.rate_limit:
+            bucket = self._buckets.setdefault(api_key, TokenBucket(self.rate_limit, self.burst))
+            if not bucket.take():
+                self.stats["throttled"] += 1
+                return JSONResponse({"status": "Failure", "message": "Rate limit exceeded"}, status_code=429)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            status = self.random.choice([500, 502, 503])
+            return JSONResponse({"status": "Failure", "message": "Internal error"}, status_code=status)
+        return None
+
+    def create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/v1/get_access_token")
+        async def get_access_token(request: Request):
+            rejected = await self._gate(request, "get_access_token", needs_access_token=False)
+            if rejected:
+                return rejected
+            expires_at = time.time() + self.token_ttl
+            token = _fake_jwt({"sub": request.headers["x-api-key"], "exp": int(expires_at), "jti": self.random.getrandbits(64)})
+            self._tokens[token] = expires_at
+            return {"status": "Success", "message": {"access_token": token}}
+
+        @app.get("/v1/get_list_of_devices")
+        async def get_list_of_devices(request: Request):
+            rejected = await self._gate(request, "get_list_of_devices")
+            if rejected:
+                return rejected
+            return {"status": "Success", "message": {"devices_list": list(self.devices.values())}}
+
+        @app.get("/v1/get_device_state")
+        async def get_device_state(request: Request, device_id: str = "all"):
+            rejected = await self._gate(request, "get_device_state")
+            if rejected:
+                return rejected
+            if device_id != "all" and device_id not in self.states:
+                return JSONResponse({"status": "Failure", "message": "Device not found"}, status_code=404)
+            selected = list(self.states.values()) if device_id == "all" else [self.states[device_id]]
+            for state in selected:
+                self._advance(state)
+            return {"status": "Success", "message": {"device_state": [dict(state) for state in selected]}}
+
+        @app.post("/v1/send_command")
+        async def send_command(request: Request):
+            rejected = await self._gate(request, "send_command")
+            if rejected:
+                return rejected
+            body = await request.json()
+            device_id = body.get("device_id")
+            command = body.get("command")
+            state = self.states.get(device_id)
+            if state is None:
+                return JSONResponse({"status": "Failure", "message": "Device not found"}, status_code=404)
+            if not isinstance(command, dict) or not command:
+                return JSONResponse({"status": "Failure", "message": "command must be a non-empty object"}, status_code=400)
+            error = self._validate_command(command)
+            if error:
+                return JSONResponse({"status": "Failure", "message": error}, status_code=400)
+            if not state["is_online"]:
+                return JSONResponse({"status": "Failure", "message": "Device is offline"}, status_code=400)
+
+            now = time.monotonic()
+            if self.device_gap and now - self._last_command.get(device_id, 0.0) < self.device_gap:
+                self.stats["device_throttled"] += 1
+                return JSONResponse({"status": "Failure", "message": "Too many commands for device"}, status_code=429)
+            self._last_command[device_id] = now
+
+            self._advance(state)
+            self.apply_command(state, command)
+            return {"status": "Success", "message": "Command sent"}
+
+        @app.get("/sim/stats")
+        async def sim_stats():
+            return dict(self.stats)
+
+        return app
+
+def add_simulator_arguments(parser: argparse.ArgumentParser, prefix: str = ""):
+    parser.add_argument(f"--{prefix}devices", type=int, default=1, help="number of simulated fans")
+    parser.add_argument(f"--{prefix}latency", default="fixed:0", help="fixed:MS, uniform:LO:HI, normal:MEAN:SD or lognormal:MEDIAN:SIGMA")
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=0.0, help="fraction of requests failing with a 5xx")
+    parser.add_argument(f"--{prefix}offline-rate", type=float, default=0.0, help="fraction of devices that are offline")
+    parser.add_argument(f"--{prefix}rate-limit", type=float, default=0.0, help="requests per second per API key, 0 for none")
+    parser.add_argument(f"--{prefix}burst", type=float, default=10.0, help="token bucket size for --rate-limit")
+    parser.add_argument(f"--{prefix}device-gap", type=float, default=0.0, help="minimum seconds between commands to one device")
+    parser.add_argument(f"--{prefix}token-ttl", type=float, default=24 * 3600, help="access token lifetime in seconds")
+    parser.add_argument(f"--{prefix}daily-limit", type=int, default=0, help="requests per day before 429, 0 for none")
+    parser.add_argument(f"--{prefix}seed", type=int, default=None)
+
+def simulator_from_args(args, prefix: str = "") -> AtombergSimulator:
+    def value(name: str):
+        return getattr(args, (prefix + name).replace("-", "_"))
+
+    return AtombergSimulator(
+        devices=value("devices"),
+        latency=value("latency"),
+        error_rate=value("error-rate"),
+        offline_rate=value("offline-rate"),
+        rate_limit=value("rate-limit"),
+        burst=value("burst"),
+        device_gap=value("device-gap"),
+        token_ttl=value("token-ttl"),
+        daily_limit=value("daily-limit"),
+        seed=value("seed")
+    )
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_simulator_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(simulator_from_args(args).create_app(), host=args.host, port=args.port)
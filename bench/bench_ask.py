@@ -0,0 +1,173 @@
+# bench_ask.py
+"""Benchmark /ask end to end against local stand-ins for Atomberg and OpenAI.
+
+Run from the repository root, for example:
+
+    python -m bench.bench_ask --concurrency 1 8 32 --requests 200 --llm-latency 400 --atomberg-latency 150
+
+Nothing leaves the machine: the bridge and the OpenAI client are pointed at
+local mock servers, and usage/registry files are written to a temp directory.
+The Atomberg side is bench.atomberg_sim, so fleet size, throttling and error
+rates can be varied with --devices, --rate-limit, --device-gap and --error-rate.
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import socket
+import sys
+import tempfile
+import time
+import httpx
+import uvicorn
+from bench.atomberg_sim import AtombergSimulator
+from bench.mock_servers import Latency, create_openai_app
+
+WORKLOADS = {
+    "english": [
+        "turn off the fan",
+        "set speed to 4",
+        "turn on the fan light",
+        "set brightness to 60",
+        "what is the fan speed",
+        "increase the speed"
+    ],
+    "hindi": [
+        "pankha band karo",
+        "pankhe ki speed 3 karo",
+        "pankhe ki light jalao",
+        "timer 2 ghante lagao",
+        "pankha kitni speed pe hai",
+        "pankhe ki speed badhao"
+    ],
+    "hinglish": [
+        "fan off kar do",
+        "fan ki speed 5 karo",
+        "fan ki light on karo",
+        "light warm mode karo",
+        "fan ka naam kya hai",
+        "speed thodi kam kar do"
+    ]
+}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(1, min(len(values), round(p / 100 * len(values) + 0.5)))
+    return values[rank - 1]
+
+async def serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+async def run_level(client: httpx.AsyncClient, queries: list, concurrency: int, total: int) -> dict:
+    latencies = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            query = queries[next_index % len(queries)]
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await client.post("/ask", json={"query": query})
+                message = response.json().get("message", "") if response.status_code == 200 else ""
+                if response.status_code != 200 or "went wrong" in message or "quota" in message:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "errors": errors
+    }
+
+async def main(args):
+    atomberg_port, openai_port, app_port = free_port(), free_port(), free_port()
+    os.environ["ATOMBERG_BASE_URL"] = f"http://127.0.0.1:{atomberg_port}/v1"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{openai_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["API_KEY"] = "bench"
+    os.environ["REFRESH_TOKEN"] = "bench"
+    if args.hedge:
+        os.environ["STATE_HEDGING"] = "1"
+
+    # api_usage.json and device_registry.json must not touch the real ones
+    sys.path.insert(0, os.getcwd())
+    os.chdir(tempfile.mkdtemp(prefix="atomberg-bench-"))
+    server = importlib.import_module("server")
+    quota = importlib.import_module("quota")
+    quota.usage.threshold = 10 ** 9
+
+    simulator = AtombergSimulator(
+        devices=args.devices,
+        latency=f"normal:{args.atomberg_latency}:{args.jitter * args.atomberg_latency}",
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        device_gap=args.device_gap,
+        seed=0
+    )
+    atomberg_app = simulator.create_app()
+    openai_app = create_openai_app(Latency(args.llm_latency, args.jitter * args.llm_latency))
+    servers = [
+        await serve(atomberg_app, atomberg_port),
+        await serve(openai_app, openai_port),
+        await serve(server.app, app_port)
+    ]
+
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=60.0, limits=limits) as client:
+        print(f"llm latency {args.llm_latency}ms, atomberg latency {args.atomberg_latency}ms, jitter {args.jitter:.0%}")
+        print(f"{'workload':<10} {'conc':>5} {'reqs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'errors':>6} {'atomberg':>8} {'llm':>5}")
+        for workload in args.workloads:
+            for concurrency in args.concurrency:
+                atomberg_before, llm_before = simulator.stats["requests"], openai_app.state.calls
+                result = await run_level(client, WORKLOADS[workload], concurrency, args.requests)
+                print(
+                    f"{workload:<10} {concurrency:>5} {args.requests:>5} {result['p50']:>9.1f} {result['p95']:>9.1f} "
+                    f"{result['p99']:>9.1f} {result['rps']:>8.1f} {result['errors']:>6} "
+                    f"{simulator.stats['requests'] - atomberg_before:>8} {openai_app.state.calls - llm_before:>5}"
+                )
+
+    for running in reversed(servers):
+        running.should_exit = True
+    await asyncio.sleep(0.2)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="requests per workload and concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=400.0, help="mean OpenAI latency in ms")
+    parser.add_argument("--atomberg-latency", type=float, default=150.0, help="mean Atomberg cloud latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency standard deviation as a fraction of the mean")
+    parser.add_argument("--devices", type=int, default=1, help="simulated fans in the Atomberg account")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of Atomberg calls failing with a 5xx")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Atomberg requests per second before 429, 0 for none")
+    parser.add_argument("--device-gap", type=float, default=0.0, help="seconds between commands to one fan before 429")
+    parser.add_argument("--hedge", action="store_true", help="turn on hedged device-state reads (STATE_HEDGING=1)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
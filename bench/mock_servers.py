@@ -0,0 +1,69 @@
+# mock_servers.py
+
+import asyncio
+import json
+import random
+import re
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+class Latency:
+    """Random delay around a mean, in milliseconds"""
+
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+
+    async def wait(self):
+        delay = max(0.0, random.gauss(self.mean_ms, self.jitter_ms)) if self.jitter_ms else self.mean_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+def _mock_plan(query: str, device_id: str) -> dict:
+    numbers = re.findall(r"\d+", query)
+    steps = [{"function": "get_devices", "params": {}}, {"function": "get_device_state", "params": {"device_id": device_id}}]
+    if numbers:
+        steps.append({"function": "send_command", "params": {"device_id": device_id, "command": {"power": True}}})
+        steps.append({"function": "send_command", "params": {"device_id": device_id, "command": {"speed": min(int(numbers[0]), 6)}}})
+    elif re.search(r"badhao|increase|tez", query):
+        steps.append({"function": "send_command", "params": {"device_id": device_id, "command": {"speed": 5}}})
+    elif re.search(r"kam|decrease|slow", query):
+        steps.append({"function": "send_command", "params": {"device_id": device_id, "command": {"speed": 2}}})
+    return {"steps": steps}
+
+def create_openai_app(latency: Latency, device_id: str = "f09e9ef2b640") -> FastAPI:
+    """Stand-in for the OpenAI chat completions endpoint, planner and summary"""
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        await latency.wait()
+        app.state.calls += 1
+        body = await request.json()
+        query = body["messages"][-1]["content"].lower()
+        if body.get("response_format"):
+            content = json.dumps(_mock_plan(query, device_id))
+        else:
+            content = "Fan ka status theek hai."
+        usage = {"prompt_tokens": 900, "completion_tokens": len(content) // 4, "total_tokens": 900 + len(content) // 4}
+        base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": body.get("model", "mock")}
+
+        if body.get("stream"):
+            async def chunks():
+                for word in content.split(" "):
+                    chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        return {
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": usage
+        }
+
+    return app
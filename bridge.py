@@ -1,67 +1,443 @@
 # atomberg_api_client.py
 
+import asyncio
+import base64
+import json
 import os
-import requests
+import time
+import httpx
 from dotenv import load_dotenv
+from metrics import Counter, Gauge, atomberg_request_seconds, cache_lookups_total
+from quota import QuotaExceeded, try_consume_quota
+from resilience import CircuitBreaker, circuit_breaker, hedge_policy, retry_policy
+from tracing import tracer
 
 # Load credentials from .env file
 load_dotenv()
 
-BASE_URL = "https://api.developer.atomberg-iot.com/v1"
+# Point ATOMBERG_BASE_URL at a local stand-in to run without the real cloud
+BASE_URL = os.getenv("ATOMBERG_BASE_URL", "https://api.developer.atomberg-iot.com/v1")
 API_KEY = os.getenv("API_KEY")
 REFRESH_TOKEN = os.getenv("REFRESH_TOKEN")
-ACCESS_TOKEN = None  # will be set by get_access_token()
 
-def get_access_token():
-    global ACCESS_TOKEN
+# Atomberg access tokens are valid for 24 hours; the JWT exp claim wins when present
+ACCESS_TOKEN_TTL = float(os.getenv("ACCESS_TOKEN_TTL", str(24 * 3600)))
+ACCESS_TOKEN_REFRESH_MARGIN = float(os.getenv("ACCESS_TOKEN_REFRESH_MARGIN", "600"))
+TOKEN_RETRY_DELAY = 30.0
+TOKEN_RETRY_MAX_DELAY = 3600.0
+# The refresh token itself was rejected; retrying on a timer cannot fix that
+TOKEN_REJECTED_STATUSES = {401, 403}
 
+# One pooled client is shared by every call so TCP+TLS handshakes are paid once
+# and idle connections are kept alive between requests.
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0)
+TOKEN_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+READ_TIMEOUT = httpx.Timeout(5.0, connect=3.0)
+COMMAND_TIMEOUT = httpx.Timeout(8.0, connect=3.0)
+
+_client = None  # created lazily by get_client()
+
+# Device state cache: device_id -> (expires_at, state). Writes update entries
+# optimistically so a read right after a command is still served from memory.
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "15"))
+_state_cache = {}
+_all_state_expires_at = 0.0
+
+# send_command keys and the device_state fields they change
+COMMAND_STATE_FIELDS = {
+    "power": "power",
+    "speed": "last_recorded_speed",
+    "sleep": "sleep_mode",
+    "timer": "timer_hours",
+    "led": "led",
+    "brightness": "last_recorded_brightness",
+    "light_mode": "last_recorded_color"
+}
+
+class AtombergAPIError(Exception):
+    """Raised when the Atomberg cloud answers with a non-200 status"""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class CircuitOpenError(AtombergAPIError):
+    """Raised without calling the cloud while the circuit breaker is open"""
+
+    def __init__(self, message: str = "The Atomberg cloud is not responding right now. Please try again shortly."):
+        super().__init__(message)
+
+retries_total = Counter("atomberg_retries_total", "Atomberg calls retried after a transient failure", ("endpoint",))
+circuit_rejections_total = Counter("atomberg_circuit_rejections_total", "Atomberg calls refused while the circuit was open", ("endpoint",))
+circuit_state = Gauge(
+    "atomberg_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open",
+    function=lambda: [CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN].index(circuit_breaker.state)
+)
+
+hedged_reads_total = Counter("atomberg_hedged_reads_total", "Hedged device-state reads by which request answered first", ("winner",))
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(base_url=BASE_URL, limits=POOL_LIMITS, timeout=READ_TIMEOUT)
+    return _client
+
+async def close_client():
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _attempt(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send one request on the shared client, timing it per endpoint and outcome"""
+    endpoint = url.lstrip("/")
+    with atomberg_request_seconds.time(endpoint=endpoint, outcome="error") as labels, tracer.span(f"atomberg.{endpoint}", method=method) as span:
+        response = await get_client().request(method, url, **kwargs)
+        labels["outcome"] = str(response.status_code)
+        span.set_attribute("status_code", response.status_code)
+        if response.status_code != 200:
+            span.fail(f"HTTP {response.status_code}")
+    return response
+
+async def _request(method: str, url: str, idempotent: bool = None, retry_throttled: bool = True, **kwargs) -> httpx.Response:
+    """Send a request through the circuit breaker, retrying transient failures.
+
+    Reads are idempotent by default; writes retry only when `idempotent` is set
+    or the cloud cannot have acted on them (see RetryPolicy). Each attempt that
+    is actually sent is charged to the daily quota, so calls the breaker refuses
+    cost nothing. Raises QuotaExceeded if the first attempt cannot be charged;
+    a retry that cannot be charged reports the previous attempt instead.
+    """
+    if idempotent is None:
+        idempotent = method == "GET"
+    endpoint = url.lstrip("/")
+    started = time.monotonic()
+    attempt = 0
+    outcome = None
+    while True:
+        if not circuit_breaker.allow():
+            circuit_rejections_total.inc(endpoint=endpoint)
+            raise CircuitOpenError()
+        if not try_consume_quota():
+            if outcome is None:
+                raise QuotaExceeded()
+            break
+        try:
+            outcome = await _attempt(method, url, **kwargs)
+        except httpx.TransportError as e:
+            outcome = e
+        circuit_breaker.record(outcome)
+
+        delay = retry_policy.next_delay(attempt, started, outcome, idempotent, retry_throttled)
+        if delay is None:
+            break
+        attempt += 1
+        retries_total.inc(endpoint=endpoint)
+        print(f"[ATOMBERG RETRY]: {endpoint} attempt {attempt + 1} in {delay:.2f}s after {getattr(outcome, 'status_code', None) or type(outcome).__name__}")
+        await asyncio.sleep(delay)
+
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
+
+def _token_expiry(token: str) -> float:
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        if exp:
+            return float(exp)
+    except Exception:
+        pass
+    return time.time() + ACCESS_TOKEN_TTL
+
+async def _fetch_access_token():
     if not API_KEY or not REFRESH_TOKEN:
         raise ValueError("API_KEY or REFRESH_TOKEN missing in .env")
-    print(API_KEY)
-    print(REFRESH_TOKEN)
     headers = {
         "x-api-key": API_KEY,
         "Authorization": f"Bearer {REFRESH_TOKEN}"
     }
 
-    response = requests.get(f"{BASE_URL}/get_access_token", headers=headers)
+    response = await _request("GET", "/get_access_token", headers=headers, timeout=TOKEN_TIMEOUT)
     if response.status_code == 200:
-        ACCESS_TOKEN = response.json().get("message", {}).get("access_token")
-        if not ACCESS_TOKEN:
+        access_token = response.json().get("message", {}).get("access_token")
+        if not access_token:
             raise Exception("Access token not present in response")
-        return ACCESS_TOKEN
+        return access_token
     else:
-        raise Exception("Failed to get access token")
+        raise AtombergAPIError("Failed to get access token", response.status_code)
+
+class TokenManager:
+    """Keeps a valid access token around so requests never wait for one.
+
+    Tokens are refreshed ACCESS_TOKEN_REFRESH_MARGIN seconds before they expire,
+    either by the background loop started with the app or lazily by the first
+    caller that notices. Concurrent refreshes share a single in-flight fetch.
+    Failed background refreshes back off exponentially up to
+    TOKEN_RETRY_MAX_DELAY; after a 401/403 the loop waits until a request asks
+    for a token instead of retrying on its own.
+    """
+
+    def __init__(self):
+        self.token = None
+        self.expires_at = 0.0  # wall clock
+        self._refresh_task = None
+        self._background_task = None
+        self._token_wanted = asyncio.Event()
+
+    def is_valid(self) -> bool:
+        return self.token is not None and time.time() < self.expires_at
+
+    def needs_refresh(self) -> bool:
+        return self.token is None or time.time() >= self.expires_at - ACCESS_TOKEN_REFRESH_MARGIN
+
+    async def _refresh(self):
+        token = await _fetch_access_token()
+        self.token = token
+        self.expires_at = _token_expiry(token)
+        return token
+
+    def _log_refresh_error(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[TOKEN REFRESH ERROR]: {task.exception()}")
+
+    def refresh(self) -> asyncio.Task:
+        """Start a refresh, or join the one already in flight"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh())
+            self._refresh_task.add_done_callback(self._log_refresh_error)
+        return self._refresh_task
+
+    async def get_token(self) -> str:
+        self._token_wanted.set()
+        if self.is_valid():
+            if self.needs_refresh():
+                # Still usable, renew in the background
+                self.refresh()
+            return self.token
+        # shield so a cancelled request does not cancel the shared refresh
+        return await asyncio.shield(self.refresh())
 
-def auth_headers():
-    if not ACCESS_TOKEN:
-        get_access_token()
+    def invalidate(self, token: str):
+        """Drop `token` after the cloud rejected it, unless it was already replaced"""
+        if self.token == token:
+            self.token = None
+            self.expires_at = 0.0
+
+    async def _keep_fresh(self):
+        failures = 0
+        rejected = False
+        while True:
+            if rejected:
+                # Wait for a request that needs a token, then follow the refresh it starts
+                self._token_wanted.clear()
+                await self._token_wanted.wait()
+            else:
+                if failures:
+                    delay = min(TOKEN_RETRY_DELAY * 2 ** (failures - 1), TOKEN_RETRY_MAX_DELAY)
+                elif self.token is not None:
+                    delay = max(self.expires_at - ACCESS_TOKEN_REFRESH_MARGIN - time.time(), TOKEN_RETRY_DELAY)
+                else:
+                    delay = 0.0
+                await asyncio.sleep(delay)
+            try:
+                await asyncio.shield(self.refresh())
+                failures, rejected = 0, False
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                rejected = isinstance(e, AtombergAPIError) and e.status_code in TOKEN_REJECTED_STATUSES
+
+    def start(self):
+        if self._background_task is None or self._background_task.done():
+            self._background_task = asyncio.ensure_future(self._keep_fresh())
+
+    async def stop(self):
+        if self._background_task is not None:
+            self._background_task.cancel()
+            try:
+                await self._background_task
+            except asyncio.CancelledError:
+                pass
+            self._background_task = None
+
+token_manager = TokenManager()
+
+async def get_access_token():
+    return await token_manager.get_token()
+
+def _auth_headers(token: str) -> dict:
     return {
         "x-api-key": API_KEY,
-        "Authorization": f"Bearer {ACCESS_TOKEN}"
+        "Authorization": f"Bearer {token}"
     }
 
-def get_devices():
-    response = requests.get(f"{BASE_URL}/get_list_of_devices", headers=auth_headers())
+async def _authed_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request with the current access token, retrying once with a new one on 401"""
+    token = await token_manager.get_token()
+    response = await _request(method, url, headers=_auth_headers(token), **kwargs)
+    if response.status_code == 401:
+        # Token rejected before its recorded expiry: refresh once and retry
+        token_manager.invalidate(token)
+        token = await token_manager.get_token()
+        response = await _request(method, url, headers=_auth_headers(token), **kwargs)
+    return response
+
+async def get_devices():
+    response = await _authed_request("GET", "/get_list_of_devices", timeout=READ_TIMEOUT)
     if response.status_code == 200:
         return response.json()
     else:
-        raise Exception("Failed to get devices")
+        raise AtombergAPIError("Failed to get devices", response.status_code)
+
+def _state_response(states: list) -> dict:
+    # Same shape the cloud returns, so cached and live reads are interchangeable
+    return {"status": "Success", "message": {"device_state": [dict(state) for state in states]}}
+
+def cached_device_state(device_id="all"):
+    """Return the cached state response for device_id, or None if it is stale"""
+    now = time.monotonic()
+    if device_id == "all":
+        if now >= _all_state_expires_at:
+            return None
+        return _state_response([state for expires_at, state in _state_cache.values() if now < expires_at])
+
+    entry = _state_cache.get(device_id)
+    if entry is None or now >= entry[0]:
+        return None
+    return _state_response([entry[1]])
+
+def cached_state(device_id: str):
+    """The cached state dict for one device, or None if it is stale"""
+    cached = cached_device_state(device_id)
+    if cached is None or device_id == "all":
+        return None
+    return cached["message"]["device_state"][0]
+
+def invalidate_state(device_id=None):
+    global _all_state_expires_at
+
+    if device_id is None:
+        _state_cache.clear()
+    else:
+        _state_cache.pop(device_id, None)
+    _all_state_expires_at = 0.0
 
-def get_device_state(device_id="all"):
-    response = requests.get(f"{BASE_URL}/get_device_state?device_id={device_id}", headers=auth_headers())
+def _store_states(data: dict, device_id: str):
+    global _all_state_expires_at
+
+    message = data.get("message") if isinstance(data, dict) else None
+    states = message.get("device_state") if isinstance(message, dict) else None
+    if not isinstance(states, list):
+        return
+
+    expires_at = time.monotonic() + STATE_CACHE_TTL
+    for state in states:
+        if isinstance(state, dict) and state.get("device_id"):
+            _state_cache[state["device_id"]] = (expires_at, dict(state))
+    if device_id == "all":
+        _all_state_expires_at = expires_at
+
+def _apply_command(device_id: str, command: dict):
+    entry = _state_cache.get(device_id)
+    if entry is None:
+        return
+    if any(key not in COMMAND_STATE_FIELDS for key in command):
+        # Unknown effect on the device, let the next read go to the cloud
+        invalidate_state(device_id)
+        return
+
+    expires_at, state = entry
+    state = dict(state)
+    for key, value in command.items():
+        state[COMMAND_STATE_FIELDS[key]] = value
+    _state_cache[device_id] = (expires_at, state)
+
+async def _timed_read(call):
+    started = time.monotonic()
+    response = await call()
     if response.status_code == 200:
-        return response.json()
+        hedge_policy.record(time.monotonic() - started)
+    return response
+
+async def _hedged_read(call) -> httpx.Response:
+    """Await `call()`, sending a second copy if the first is slower than usual.
+
+    The first 200 wins and the other request is cancelled. With hedging off,
+    too little history or no hedge budget left, this is just `call()`.
+    """
+    delay = hedge_policy.delay()
+    if delay is None:
+        return await _timed_read(call)
+
+    primary = asyncio.ensure_future(_timed_read(call))
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done or not hedge_policy.try_acquire():
+            return await primary
+
+        hedge = asyncio.ensure_future(_timed_read(call))
+        pending.add(hedge)
+        tracer.set_attribute("hedged", True)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code == 200:
+                    hedged_reads_total.inc(winner="hedge" if task is hedge else "primary")
+                    return task.result()
+        # Neither copy succeeded (the hedge may have found no quota left); report the primary like an unhedged read
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def get_device_state(device_id="all", use_cache=True):
+    if use_cache:
+        cached = cached_device_state(device_id)
+        cache_lookups_total.inc(cache="device_state", result="miss" if cached is None else "hit")
+        tracer.set_attribute("cache", "miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+    # Device state is on the critical path of most plans, so its slow tail may be hedged
+    response = await _hedged_read(
+        lambda: _authed_request("GET", "/get_device_state", params={"device_id": device_id}, timeout=READ_TIMEOUT)
+    )
+    if response.status_code == 200:
+        data = response.json()
+        _store_states(data, device_id)
+        return data
     else:
-        raise Exception("Failed to get device state")
+        raise AtombergAPIError("Failed to get device state", response.status_code)
+
+def _is_idempotent(command: dict) -> bool:
+    # Every known key sets an absolute value, so applying the command twice is harmless
+    return all(key in COMMAND_STATE_FIELDS for key in command)
 
-def send_command(device_id: str, command: dict):
+async def send_command(device_id: str, command: dict):
     payload = {
         "device_id": device_id,
         "command": command
     }
-    response = requests.post(f"{BASE_URL}/send_command", json=payload, headers=auth_headers())
+    try:
+        response = await _authed_request(
+            "POST", "/send_command", json=payload, timeout=COMMAND_TIMEOUT,
+            idempotent=_is_idempotent(command),
+            # Writes go through the device pacer, which must see every 429, 503 and timeout to widen its gap
+            retry_throttled=False
+        )
+    except BaseException:
+        # The command may or may not have reached the fan, also when the request was cancelled
+        invalidate_state(device_id)
+        raise
     if response.status_code == 200:
+        _apply_command(device_id, command)
         return response.json()
     else:
-        raise Exception("Failed to send command")
+        invalidate_state(device_id)
+        raise AtombergAPIError("Failed to send command", response.status_code)
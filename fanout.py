@@ -0,0 +1,56 @@
+# command_fanout.py
+
+import asyncio
+import os
+import registry
+from bridge import send_command
+from pacing import pacer
+
+MAX_FANOUT_CONCURRENCY = int(os.getenv("MAX_FANOUT_CONCURRENCY", "8"))
+
+async def resolve_devices(target) -> list:
+    """Device ids for "all", {"room": name} or an explicit list of ids.
+
+    Raises ValueError for a malformed target or one that matches no device, so
+    a command sent nowhere is never mistaken for one that succeeded.
+    """
+    if isinstance(target, list):
+        device_ids = list(dict.fromkeys(str(device_id) for device_id in target))
+    elif target == "all":
+        devices = await registry.list_devices()
+        device_ids = [device["device_id"] for device in devices if device.get("device_id")]
+    elif isinstance(target, dict) and target.get("room"):
+        devices = await registry.list_devices()
+        room = str(target["room"]).strip().lower()
+        device_ids = [
+            device["device_id"] for device in devices
+            if device.get("device_id") and str(device.get("room", "")).strip().lower() == room
+        ]
+    else:
+        raise ValueError(f"Unknown device target: {target}")
+    if not device_ids:
+        raise ValueError(f"No devices found for target: {target}")
+    return device_ids
+
+async def fan_out(target, command: dict, max_concurrency: int = MAX_FANOUT_CONCURRENCY) -> dict:
+    """Send one command to many devices at once.
+
+    At most max_concurrency commands are in flight, and each device still goes
+    through the shared pacer. One device failing does not stop the others; the
+    outcome of every device is reported.
+    """
+    device_ids = await resolve_devices(target)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def send(device_id: str) -> dict:
+        async with semaphore:
+            try:
+                result = await pacer.run(device_id, lambda: send_command(device_id, command))
+            except Exception as e:
+                return {"ok": False, "error": str(e)}
+            return {"ok": True, "result": result}
+
+    outcomes = await asyncio.gather(*(send(device_id) for device_id in device_ids))
+    results = dict(zip(device_ids, outcomes))
+    succeeded = sum(1 for outcome in outcomes if outcome["ok"])
+    return {"devices": results, "succeeded": succeeded, "failed": len(outcomes) - succeeded}
@@ -0,0 +1,157 @@
+# fuzzy_plan_cache.py
+
+import copy
+import difflib
+import os
+import time
+from collections import Counter, OrderedDict
+import registry
+from metrics import Gauge
+from intent import (
+    ALL_WORDS,
+    BRIGHTNESS_WORDS,
+    LIGHT_MODES,
+    LIGHT_WORDS,
+    OFF_WORDS,
+    ON_WORDS,
+    RELATIVE_WORDS,
+    SLEEP_WORDS,
+    SPEED_WORDS,
+    TIMER_WORDS
+)
+from plan_cache import PLAN_CACHE_SIZE, PLAN_CACHE_TTL, normalize_query
+
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_PLAN_THRESHOLD", "0.7"))
+
+UP_WORDS = {"badhao", "badha", "increase", "tez", "fast", "up", "more", "बढ़ाओ", "तेज़"}
+DOWN_WORDS = {"kam", "decrease", "slow", "down", "less", "कम"}
+FEATURES = {
+    "speed": SPEED_WORDS,
+    "brightness": BRIGHTNESS_WORDS,
+    "timer": TIMER_WORDS,
+    "sleep": SLEEP_WORDS,
+    "light": LIGHT_WORDS,
+    "all": ALL_WORDS
+}
+
+# "speed badhao" means one step above whatever the fan is at now
+RELATIVE_QUERY_WORDS = RELATIVE_WORDS | UP_WORDS | DOWN_WORDS
+
+SLOT_VOCABULARY = sorted(
+    ON_WORDS | OFF_WORDS | RELATIVE_QUERY_WORDS | set(LIGHT_MODES)
+    | set().union(*FEATURES.values())
+)
+
+def _canonical(word: str) -> str:
+    # Map a misspelt slot word ("speeed", "badao") onto the vocabulary; short words must match exactly
+    if len(word) < 4 or word.isdecimal() or word in SLOT_VOCABULARY:
+        return word
+    matches = difflib.get_close_matches(word, SLOT_VOCABULARY, n=1, cutoff=0.8)
+    return matches[0] if matches else word
+
+def is_relative_query(query: str) -> bool:
+    """Whether the query asks for a change relative to the current state.
+
+    The planner turns these into absolute values using the last known state,
+    so their plans must not be cached.
+    """
+    return any(_canonical(word) in RELATIVE_QUERY_WORDS for word in normalize_query(query).split())
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _device_words() -> set:
+    words = set()
+    for device in registry.cached_devices():
+        for field in ("room", "name"):
+            words.update(str(device.get(field) or "").lower().split())
+    return words
+
+def query_slots(key: str) -> tuple:
+    """What must match exactly for two similar queries to share a plan"""
+    words = [_canonical(word) for word in key.split()]
+    word_set = set(words)
+    return (
+        tuple(word for word in words if word.isdecimal()),
+        bool(word_set & ON_WORDS),
+        bool(word_set & OFF_WORDS),
+        frozenset(name for name, vocabulary in FEATURES.items() if word_set & vocabulary),
+        frozenset(word_set & set(LIGHT_MODES)),
+        frozenset(word_set & _device_words())
+    )
+
+class FuzzyPlanIndex:
+    """Plan cache that also matches misspelt repeats of earlier queries.
+
+    Queries are compared by Dice similarity of their character trigrams, found
+    through an inverted index. A cached plan is only reused when similarity is
+    at least `threshold` and the slots (numbers, on/off, features, light mode
+    and room or device names) are identical. Relative queries ("speed
+    badhao") are never stored or served, as their plans depend on state.
+    """
+
+    def __init__(self, max_size: int = PLAN_CACHE_SIZE, ttl: float = PLAN_CACHE_TTL, threshold: float = FUZZY_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # key -> (expires_at, plan, trigrams, slots)
+        self._postings = {}  # trigram -> keys containing it
+
+    def _remove(self, key: str):
+        _, _, grams, _ = self._entries.pop(key)
+        for gram in grams:
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def get(self, query: str):
+        if is_relative_query(query):
+            return None
+        key = normalize_query(query)
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+
+        now = time.monotonic()
+        slots = None
+        best_key, best_score = None, 0.0
+        for candidate, overlap in shared.most_common():
+            expires_at, _, candidate_grams, candidate_slots = self._entries[candidate]
+            score = 2 * overlap / (len(grams) + len(candidate_grams))
+            if score < self.threshold:
+                # most_common is sorted by overlap, but scores also depend on length
+                continue
+            if now >= expires_at:
+                continue
+            if slots is None:
+                slots = query_slots(key)
+            if candidate_slots == slots and score > best_score:
+                best_key, best_score = candidate, score
+
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        return copy.deepcopy(self._entries[best_key][1])
+
+    def put(self, query: str, plan: list):
+        if is_relative_query(query):
+            return
+        key = normalize_query(query)
+        if key in self._entries:
+            self._remove(key)
+        grams = trigrams(key)
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(plan), grams, query_slots(key))
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+fuzzy_plan_cache = FuzzyPlanIndex()
+fuzzy_plan_cache_entries = Gauge("fuzzy_plan_cache_entries", "Plans held in the fuzzy plan index", function=lambda: len(fuzzy_plan_cache))
@@ -0,0 +1,128 @@
+# intent_parser.py
+
+import os
+from plan_cache import normalize_query
+
+# Device the fast path targets, same default the planner prompt uses
+DEFAULT_DEVICE_ID = os.getenv("DEFAULT_DEVICE_ID", "f09e9ef2b640")
+
+FAN_WORDS = {"fan", "fans", "pankha", "पंखा", "पंखे"}
+# Any of these sends the command to every device in one fan-out step
+ALL_WORDS = {"all", "every", "sab", "sabhi", "saare", "sare", "सब", "सभी", "सारे"}
+LIGHT_WORDS = {"light", "lights", "led", "batti", "लाइट", "बत्ती"}
+ON_WORDS = {"on", "chalu", "start", "shuru", "jalao", "jala", "chalao", "चालू", "चालु", "जलाओ", "चलाओ", "ऑन"}
+OFF_WORDS = {"off", "band", "stop", "bujhao", "bujha", "बंद", "बुझाओ", "ऑफ"}
+SPEED_WORDS = {"speed", "स्पीड"}
+BRIGHTNESS_WORDS = {"brightness", "ब्राइटनेस"}
+TIMER_WORDS = {"timer", "टाइमर"}
+SLEEP_WORDS = {"sleep", "स्लीप"}
+LIGHT_MODES = {"cool": "cool", "warm": "warm", "daylight": "daylight"}
+# Relative changes need the current level, which only the LLM plan reasons about
+RELATIVE_WORDS = {"badhao", "badha", "kam", "increase", "decrease", "tez", "slow", "fast", "up", "down", "more", "less", "बढ़ाओ", "कम", "तेज़"}
+CONNECTORS = {"and", "aur", "then", "phir", "also", "और", "फिर"}
+FILLERS = {
+    "the", "a", "my", "please", "turn", "switch", "set", "make", "to", "at", "of", "mode",
+    "kar", "karo", "kare", "karna", "karke", "do", "de", "dena", "dijiye", "ki", "ka", "ke", "ko",
+    "pe", "par", "hour", "hours", "hr", "hrs", "ghanta", "ghante", "lagao", "laga",
+    "percent", "level", "now", "abhi", "zara", "jara", "करो", "कर", "दो", "की", "का", "के", "को", "पर",
+    "घंटे", "घंटा", "लगाओ", "मोड"
+}
+
+def _clause_command(words: list):
+    """Return the command dict for one clause, or None if it is not understood"""
+    numbers = [int(word) for word in words if word.isdecimal()]
+    on = any(word in ON_WORDS for word in words)
+    off = any(word in OFF_WORDS for word in words)
+    if on and off or len(numbers) > 1:
+        return None
+
+    if any(word in TIMER_WORDS for word in words):
+        if off and not numbers:
+            return {"timer": 0}
+        if numbers and 0 <= numbers[0] <= 4:
+            return {"timer": numbers[0]}
+        return None
+
+    if any(word in SLEEP_WORDS for word in words):
+        return None if numbers else {"sleep": not off}
+
+    if any(word in SPEED_WORDS for word in words):
+        if numbers and 1 <= numbers[0] <= 6 and not off:
+            return {"speed": numbers[0]}
+        return None
+
+    if any(word in BRIGHTNESS_WORDS for word in words):
+        if numbers and 10 <= numbers[0] <= 100 and not off:
+            return {"brightness": numbers[0]}
+        return None
+
+    modes = [LIGHT_MODES[word] for word in words if word in LIGHT_MODES]
+    if modes:
+        return {"light_mode": modes[0]} if len(modes) == 1 and not numbers and not off else None
+
+    if numbers or not (on or off):
+        return None
+    if any(word in LIGHT_WORDS for word in words):
+        return {"led": on}
+    return {"power": on}
+
+def _words_understood(words: list) -> bool:
+    vocabulary = (
+        FAN_WORDS | ALL_WORDS | LIGHT_WORDS | ON_WORDS | OFF_WORDS | SPEED_WORDS | BRIGHTNESS_WORDS
+        | TIMER_WORDS | SLEEP_WORDS | set(LIGHT_MODES) | CONNECTORS | FILLERS
+    )
+    return all(word in vocabulary or word.isdecimal() for word in words)
+
+def parse_intent(query: str, device_id: str = DEFAULT_DEVICE_ID):
+    """Build a plan for simple fan/light commands without the LLM.
+
+    Returns the plan in the same format the planner produces, or None when any
+    word is not understood or the request is relative ("speed badhao"), in
+    which case the caller should fall back to the LLM.
+    """
+    words = normalize_query(query).split()
+    if not words or any(word in RELATIVE_WORDS for word in words) or not _words_understood(words):
+        return None
+
+    clauses = [[]]
+    for word in words:
+        if word in CONNECTORS:
+            clauses.append([])
+        else:
+            clauses[-1].append(word)
+
+    commands = []
+    for clause in clauses:
+        if not clause:
+            continue
+        command = _clause_command(clause)
+        if command is None:
+            return None
+        commands.append(command)
+    if not commands:
+        return None
+
+    if any(word in ALL_WORDS for word in words):
+        command = {}
+        for clause_command in commands:
+            if "speed" in clause_command:
+                command["power"] = True
+            elif "brightness" in clause_command or "light_mode" in clause_command:
+                command["led"] = True
+            command.update(clause_command)
+        return [
+            {"function": "get_devices"},
+            {"function": "send_command_many", "params": {"target": "all", "command": command}}
+        ]
+
+    plan = [{"function": "get_devices"}]
+    if any(key in command for command in commands for key in ("speed", "brightness", "light_mode")):
+        plan.append({"function": "get_device_state", "params": {"device_id": device_id}})
+    for command in commands:
+        # Like the planner examples, power the fan (or its light) on before adjusting it
+        if "speed" in command:
+            plan.append({"function": "send_command", "params": {"device_id": device_id, "command": {"power": True}}})
+        elif "brightness" in command or "light_mode" in command:
+            plan.append({"function": "send_command", "params": {"device_id": device_id, "command": {"led": True}}})
+        plan.append({"function": "send_command", "params": {"device_id": device_id, "command": command}})
+    return plan
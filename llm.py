@@ -0,0 +1,65 @@
+# llm_client.py
+
+import os
+import time
+from collections import deque
+import httpx
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL = "gpt-4.1-nano"
+
+# Shared async client so every /ask reuses the same pooled connections to the
+# OpenAI API instead of blocking the event loop on a synchronous call.
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+PLAN_TIMEOUT = httpx.Timeout(20.0, connect=5.0)
+SUMMARY_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+MAX_RETRIES = 1
+
+_client = None  # created lazily by get_client()
+
+def get_client() -> openai.AsyncOpenAI:
+    global _client
+
+    if _client is None:
+        _client = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=PLAN_TIMEOUT,
+            max_retries=MAX_RETRIES,
+            http_client=httpx.AsyncClient(limits=POOL_LIMITS, timeout=PLAN_TIMEOUT)
+        )
+    return _client
+
+async def close_client():
+    global _client
+
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+# Token usage per LLM call, kept to track planning cost across prompt changes
+USAGE_HISTORY = 200
+usage_records = deque(maxlen=USAGE_HISTORY)
+usage_totals = {}  # stage -> summed counts
+
+def record_usage(stage: str, usage, prompt_version: str):
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    record = {
+        "stage": stage,
+        "prompt_version": prompt_version,
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "time": time.time()
+    }
+    usage_records.append(record)
+
+    totals = usage_totals.setdefault(stage, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0})
+    totals["calls"] += 1
+    for key in ("prompt_tokens", "cached_tokens", "completion_tokens"):
+        totals[key] += record[key]
+    return record
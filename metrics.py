@@ -0,0 +1,137 @@
+# metrics.py
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; wide enough for cached reads (sub-millisecond) and slow LLM calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = []  # every metric, in registration order, for render()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _samples(self) -> list:
+        with self._lock:
+            return [(f"{self.name}{_labels(self.label_names, key)}", value) for key, value in sorted(self._values.items())]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{sample} {_number(value)}" for sample, value in self._samples())
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """A value that goes up and down, or is read from `function` at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), function=None):
+        super().__init__(name, description, labels)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self) -> list:
+        if self.function is not None:
+            return [(self.name, self.function())]
+        return super()._samples()
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]  # bucket counts, count, sum
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block; labels may be changed inside it, e.g. an outcome"""
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            entries = sorted((key, ([*counts], count, total)) for key, (counts, count, total) in self._values.items())
+        for key, (counts, count, total) in entries:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), (*counts, 0)):
+                cumulative = count if bound == math.inf else cumulative + bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Shared metrics, labelled so one series covers every stage, endpoint or cache
+ask_stage_seconds = Histogram("ask_stage_seconds", "Time spent in each stage of an /ask request", ("stage",))
+atomberg_request_seconds = Histogram(
+    "atomberg_request_seconds", "Atomberg cloud call latency by endpoint and outcome", ("endpoint", "outcome")
+)
+llm_request_seconds = Histogram("llm_request_seconds", "OpenAI call latency by stage", ("stage", "outcome"))
+plan_step_seconds = Histogram("plan_step_seconds", "Time to run one plan step by function and outcome", ("function", "outcome"))
+pacing_wait_seconds = Histogram("pacing_wait_seconds", "Time writes waited for a device's pacing gap")
+plan_source_total = Counter("plan_source_total", "Plans by where they came from", ("source",))
+coalesced_calls_total = Counter("coalesced_calls_total", "send_command calls saved by merging steps for the same device")
+skipped_steps_total = Counter("skipped_steps_total", "Plan steps elided before execution by reason", ("reason",))
+cache_lookups_total = Counter("cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
@@ -0,0 +1,70 @@
+# device_pacing.py
+
+import asyncio
+import time
+import httpx
+from bridge import AtombergAPIError
+from metrics import pacing_wait_seconds
+from resilience import THROTTLE_STATUSES
+
+def is_throttle(error: Exception) -> bool:
+    if isinstance(error, httpx.TimeoutException):
+        return True
+    return isinstance(error, AtombergAPIError) and error.status_code in THROTTLE_STATUSES
+
+class DevicePacer:
+    """Spaces out writes to the same device and learns the minimum safe gap.
+
+    The gap follows AIMD on the send rate: every accepted write shrinks the
+    gap by `step` (additive increase of rate), every throttle or timeout
+    multiplies it by `backoff` (multiplicative decrease of rate). `call` must
+    not retry throttles itself (send_command passes retry_throttled=False), or
+    they would be sent without the gap and never reach record_throttle. Writes
+    to different devices never wait on each other and reads are not paced at all.
+    """
+
+    def __init__(self, initial_gap=0.4, min_gap=0.1, max_gap=5.0, step=0.05, backoff=2.0):
+        self.initial_gap = initial_gap
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.step = step
+        self.backoff = backoff
+        self._gaps = {}
+        self._last_write = {}
+        self._locks = {}
+
+    def gap(self, device_id: str) -> float:
+        return self._gaps.get(device_id, self.initial_gap)
+
+    def _lock(self, device_id: str) -> asyncio.Lock:
+        lock = self._locks.get(device_id)
+        if lock is None:
+            lock = self._locks[device_id] = asyncio.Lock()
+        return lock
+
+    def record_success(self, device_id: str):
+        self._gaps[device_id] = max(self.min_gap, self.gap(device_id) - self.step)
+
+    def record_throttle(self, device_id: str):
+        self._gaps[device_id] = min(self.max_gap, self.gap(device_id) * self.backoff)
+
+    async def run(self, device_id: str, call):
+        """Await `call()` once the device's gap since its last write has elapsed"""
+        async with self._lock(device_id):
+            last = self._last_write.get(device_id)
+            wait = 0.0 if last is None else last + self.gap(device_id) - time.monotonic()
+            pacing_wait_seconds.observe(max(wait, 0.0))
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                result = await call()
+            except Exception as e:
+                if is_throttle(e):
+                    self.record_throttle(device_id)
+                raise
+            finally:
+                self._last_write[device_id] = time.monotonic()
+            self.record_success(device_id)
+            return result
+
+pacer = DevicePacer()
@@ -0,0 +1,81 @@
+# plan_cache.py
+
+import copy
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from metrics import Gauge
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", str(24 * 3600)))
+
+# Common spelling variants folded onto one form before lookup
+SPELLING_VARIANTS = {
+    "pankhaa": "pankha",
+    "pnkha": "pankha",
+    "pankhe": "pankha",
+    "fann": "fan",
+    "kr": "kar",
+    "kro": "karo",
+    "krdo": "kar do",
+    "kardo": "kar do",
+    "krna": "karna",
+    "krke": "karke",
+    "bnd": "band",
+    "bandh": "band",
+    "chalo": "chalu",
+    "chaalu": "chalu",
+    "lite": "light",
+    "plz": "please",
+    "pls": "please",
+    "one": "1",
+    "two": "2",
+    "three": "3",
+    "four": "4",
+    "five": "5",
+    "six": "6"
+}
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and fold spelling variants"""
+    text = "".join(
+        " " if unicodedata.category(ch)[0] in "PS" else ch
+        for ch in query.lower()
+    )
+    words = [SPELLING_VARIANTS.get(word, word) for word in text.split()]
+    return re.sub(r"\s+", " ", " ".join(words)).strip()
+
+class PlanCache:
+    """LRU cache of validated plans keyed on the normalized user query"""
+
+    def __init__(self, max_size: int = PLAN_CACHE_SIZE, ttl: float = PLAN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, plan)
+
+    def get(self, query: str):
+        key = normalize_query(query)
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry[0]:
+            if entry is not None:
+                del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        # Callers rewrite plans in place, so never hand out the stored copy
+        return copy.deepcopy(entry[1])
+
+    def put(self, query: str, plan: list):
+        key = normalize_query(query)
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(plan))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+plan_cache = PlanCache()
+# Hits and misses are counted per lookup in cache_lookups_total
+plan_cache_entries = Gauge("plan_cache_entries", "Plans held in the exact-match plan cache", function=lambda: len(plan_cache))
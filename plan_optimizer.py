@@ -0,0 +1,179 @@
+# plan_optimizer.py
+
+from bridge import COMMAND_STATE_FIELDS
+
+KNOWN_FUNCTIONS = ["get_access_token", "get_devices", "get_device_state", "send_command", "send_command_many"]
+
+def is_valid_plan(plan) -> bool:
+    """Whether plan is a list of steps that only call known bridge functions"""
+    if not isinstance(plan, list) or not plan:
+        return False
+    for task in plan:
+        if not isinstance(task, dict) or task.get("function") not in KNOWN_FUNCTIONS:
+            return False
+        if not isinstance(task.get("params", {}), dict):
+            return False
+        if task["function"] == "send_command":
+            params = task.get("params", {})
+            if not params.get("device_id") or not isinstance(params.get("command"), dict):
+                return False
+        if task["function"] == "send_command_many":
+            params = task.get("params", {})
+            if not params.get("target") or not isinstance(params.get("command"), dict):
+                return False
+    return True
+
+def coalesce_commands(plan: list) -> tuple[list, int]:
+    """Merge adjacent send_command steps for the same device into one command.
+
+    Steps are merged only while they are consecutive, so any read or command to
+    another device in between keeps its ordering. When two merged commands set
+    the same key the later step wins, matching what sequential execution would
+    have left on the fan; key order follows first appearance so `power` still
+    precedes `speed`. Returns the new plan and the number of calls saved.
+    """
+    coalesced = []
+    saved = 0
+
+    for task in plan:
+        params = task.get("params") or {}
+        previous = coalesced[-1] if coalesced else None
+
+        if (
+            previous is not None
+            and task.get("function") == "send_command"
+            and previous.get("function") == "send_command"
+            and isinstance(params.get("command"), dict)
+            and isinstance(previous["params"].get("command"), dict)
+            and params.get("device_id") == previous["params"].get("device_id")
+        ):
+            previous["params"]["command"].update(params["command"])
+            saved += 1
+            continue
+
+        if task.get("function") == "send_command" and isinstance(params.get("command"), dict):
+            # Copy so merging never mutates the caller's plan
+            task = {**task, "params": {**params, "command": dict(params["command"])}}
+        coalesced.append(task)
+
+    return coalesced, saved
+
+# Keys that only take effect while the fan motor or its light is on
+FAN_KEYS = {"speed", "sleep", "timer"}
+LIGHT_KEYS = {"brightness", "light_mode"}
+
+# Keys switched on before a command that sets any of the keys they map to
+PRECONDITIONS = {"power": {"speed"}, "led": LIGHT_KEYS}
+
+def add_preconditions(plan: list) -> list:
+    """Turn the fan or its light on in commands that only work while it is on.
+
+    Plans are cached by query text, so they must not depend on the state the
+    device was in when they were made. As in the local intent rules, a speed
+    command gets `power: true` and a brightness or light_mode command gets
+    `led: true`, unless the command or an earlier step in the plan already sets
+    that key for the device. optimize_plan drops the added key again when the
+    cached state shows it is already on.
+    """
+    result = []
+    switched = set()  # (device_id, key) set by an earlier send_command
+
+    for task in plan:
+        params = task.get("params") or {}
+        command = params.get("command")
+        if task.get("function") in ("send_command", "send_command_many") and isinstance(command, dict):
+            device_id = params.get("device_id", "many")
+            needed = {}
+            for key, keys in PRECONDITIONS.items():
+                if keys & command.keys() and key not in command and (device_id, key) not in switched:
+                    needed[key] = True
+            if needed:
+                task = {**task, "params": {**params, "command": {**needed, **command}}}
+            if task["function"] == "send_command":
+                switched.update((device_id, key) for key in task["params"]["command"] if key in PRECONDITIONS)
+        result.append(task)
+
+    return result
+
+def _is_noop(key: str, value, state: dict) -> bool:
+    field = COMMAND_STATE_FIELDS.get(key)
+    if field is None or field not in state or state[field] != value:
+        return False
+    if key in FAN_KEYS:
+        return state.get("power") is True
+    if key in LIGHT_KEYS:
+        return state.get("led") is True
+    return True
+
+def optimize_plan(plan: list, token_valid: bool, state_lookup) -> tuple[list, list]:
+    """Drop plan steps that cannot change anything.
+
+    Removes get_access_token while the managed token is valid, repeated
+    get_devices, state reads already made with no write to that device in
+    between, and send_command keys that the cached state (via
+    `state_lookup(device_id)`) shows are already set. Returns the new plan and
+    a list of (step, reason) for everything removed; an elided command key is
+    reported as a send_command step holding just those keys.
+    """
+    optimized = []
+    skipped = []
+    seen_devices = False
+    read_devices = set()  # devices read since their last write, "all" included
+    states = {}  # device_id -> expected state as the plan progresses
+
+    for task in plan:
+        func = task.get("function")
+        params = task.get("params") or {}
+
+        if func == "get_access_token" and token_valid:
+            skipped.append((task, "access token still valid"))
+            continue
+
+        if func == "get_devices":
+            if seen_devices:
+                skipped.append((task, "device list already fetched"))
+                continue
+            seen_devices = True
+
+        elif func == "get_device_state":
+            device_id = params.get("device_id", "all")
+            if device_id in read_devices or "all" in read_devices:
+                skipped.append((task, "state already read"))
+                continue
+            read_devices.add(device_id)
+
+        elif func == "send_command" and isinstance(params.get("command"), dict):
+            device_id = params.get("device_id")
+            if device_id not in states:
+                cached = state_lookup(device_id)
+                states[device_id] = dict(cached) if cached else None
+            state = states[device_id]
+
+            command = params["command"]
+            if state is not None:
+                noop = {key: value for key, value in command.items() if _is_noop(key, value, state)}
+                if noop:
+                    skipped.append((
+                        {"function": "send_command", "params": {"device_id": device_id, "command": noop}},
+                        "already set"
+                    ))
+                    command = {key: value for key, value in command.items() if key not in noop}
+                    if not command:
+                        continue
+                    task = {**task, "params": {**params, "command": command}}
+                for key, value in command.items():
+                    if key in COMMAND_STATE_FIELDS:
+                        state[COMMAND_STATE_FIELDS[key]] = value
+
+            # The device changed, so a later read is no longer redundant
+            read_devices.discard(device_id)
+            read_devices.discard("all")
+
+        elif func == "send_command_many":
+            # Any device may have changed
+            read_devices.clear()
+            states.clear()
+
+        optimized.append(task)
+
+    return optimized, skipped
@@ -0,0 +1,237 @@
+# plan_schema.py
+
+import ast
+import json
+import re
+from intent import DEFAULT_DEVICE_ID
+from plan_optimizer import KNOWN_FUNCTIONS, is_valid_plan
+
+BOOL_KEYS = {"power", "sleep", "led"}
+INT_RANGES = {"speed": (1, 6), "timer": (0, 4), "brightness": (10, 100)}
+LIGHT_MODES = ["cool", "warm", "daylight"]
+
+def _nullable(schema: dict) -> dict:
+    # Strict mode needs every property listed as required, so optional ones allow null
+    return {"anyOf": [schema, {"type": "null"}]}
+
+COMMAND_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "power": _nullable({"type": "boolean"}),
+        "speed": _nullable({"type": "integer", "enum": list(range(1, 7))}),
+        "sleep": _nullable({"type": "boolean"}),
+        "timer": _nullable({"type": "integer", "enum": list(range(0, 5))}),
+        "led": _nullable({"type": "boolean"}),
+        "brightness": _nullable({"type": "integer"}),
+        "light_mode": _nullable({"type": "string", "enum": LIGHT_MODES})
+    },
+    "required": ["power", "speed", "sleep", "timer", "led", "brightness", "light_mode"],
+    "additionalProperties": False
+}
+
+def _step_schema(function: str, properties: dict) -> dict:
+    return {
+        "type": "object",
+        "properties": {
+            "function": {"type": "string", "enum": [function]},
+            "params": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False
+            }
+        },
+        "required": ["function", "params"],
+        "additionalProperties": False
+    }
+
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "steps": {
+            "type": "array",
+            "items": {"anyOf": [
+                _step_schema("get_access_token", {}),
+                _step_schema("get_devices", {}),
+                _step_schema("get_device_state", {"device_id": {"type": "string"}}),
+                _step_schema("send_command", {"device_id": {"type": "string"}, "command": COMMAND_SCHEMA}),
+                _step_schema("send_command_many", {
+                    "target": {"anyOf": [
+                        {"type": "string", "enum": ["all"]},
+                        {"type": "array", "items": {"type": "string"}},
+                        {
+                            "type": "object",
+                            "properties": {"room": {"type": "string"}},
+                            "required": ["room"],
+                            "additionalProperties": False
+                        }
+                    ]},
+                    "command": COMMAND_SCHEMA
+                })
+            ]}
+        }
+    },
+    "required": ["steps"],
+    "additionalProperties": False
+}
+
+# Passed as response_format so the planner can only emit plans matching PLAN_SCHEMA
+PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "function_call_plan", "strict": True, "schema": PLAN_SCHEMA}
+}
+
+def _clean(text: str, words: dict) -> str:
+    """Drop comments and trailing commas and swap literal words, outside strings"""
+    out = []
+    i = 0
+    quote = None
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            out.append(ch)
+            if ch == "\\":
+                out.append(text[i + 1:i + 2])
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+            i += 1
+            continue
+        if ch in "\"'":
+            quote = ch
+        elif text.startswith("//", i) or ch == "#":
+            end = text.find("\n", i)
+            i = len(text) if end == -1 else end
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end == -1 else end + 2
+            continue
+        elif ch in "]}":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+        elif ch.isascii() and ch.isalpha():
+            match = re.match(r"[A-Za-z_]+", text[i:])
+            word = match.group(0)
+            out.append(words.get(word, word))
+            i += len(word)
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+def _parse_loose(text: str):
+    text = text.strip()
+    fence = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    if fence:
+        text = fence.group(1)
+
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    # Keep only the outermost JSON-looking span, dropping any prose around it
+    starts = [i for i in (text.find("["), text.find("{")) if i != -1]
+    end = max(text.rfind("]"), text.rfind("}"))
+    if not starts or end < min(starts):
+        return None
+    text = text[min(starts):end + 1]
+
+    try:
+        return json.loads(_clean(text, {"True": "true", "False": "false", "None": "null"}))
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(_clean(text, {"true": "True", "false": "False", "null": "None"}))
+    except (ValueError, SyntaxError):
+        return None
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("true", "on", "1", "false", "off", "0"):
+        return value.strip().lower() in ("true", "on", "1")
+    return None
+
+def _to_int(value, low: int, high: int):
+    if isinstance(value, bool):
+        return None
+    try:
+        number = int(float(value))
+    except (TypeError, ValueError):
+        return None
+    return min(max(number, low), high)
+
+def normalize_command(command: dict) -> dict:
+    """Coerce command values to the documented types and ranges, dropping the rest"""
+    normalized = {}
+    for key, value in command.items():
+        if value is None:
+            continue
+        if key in BOOL_KEYS:
+            value = _to_bool(value)
+        elif key in INT_RANGES:
+            value = _to_int(value, *INT_RANGES[key])
+        elif key == "light_mode":
+            value = str(value).strip().lower()
+            value = value if value in LIGHT_MODES else None
+        else:
+            value = None
+        if value is None:
+            print(f"[PLAN REPAIR]: dropped command {key}={command[key]!r}")
+            continue
+        normalized[key] = value
+    return normalized
+
+def normalize_plan(plan) -> list:
+    if isinstance(plan, dict):
+        plan = plan.get("steps", plan.get("plan", [plan]))
+    if not isinstance(plan, list):
+        return None
+
+    steps = []
+    for task in plan:
+        if not isinstance(task, dict):
+            continue
+        # Tool-call style {"name": ..., "arguments": ...} is accepted too
+        func = str(task.get("function") or task.get("name") or "").strip().removesuffix("()")
+        if func not in KNOWN_FUNCTIONS:
+            print(f"[PLAN REPAIR]: dropped unknown function {func!r}")
+            continue
+        params = task.get("params", task.get("arguments", task.get("args"))) or {}
+        if isinstance(params, str):
+            params = _parse_loose(params) or {}
+        if not isinstance(params, dict):
+            params = {}
+        params = {key: value for key, value in params.items() if value is not None}
+
+        if func in ("send_command", "send_command_many"):
+            command = normalize_command(params.get("command") or {})
+            if not command:
+                continue
+            params["command"] = command
+        if func == "send_command" and not params.get("device_id"):
+            params["device_id"] = DEFAULT_DEVICE_ID
+        step = {"function": func}
+        if params:
+            step["params"] = params
+        steps.append(step)
+    return steps
+
+def extract_plan(text: str):
+    """Parse planner output into a validated plan, repairing it where possible.
+
+    Handles code fences, prose around the JSON, comments, trailing commas,
+    Python-style literals and the {"steps": [...]} wrapper the schema uses.
+    Returns None if no valid plan can be recovered.
+    """
+    if not text:
+        return None
+    plan = normalize_plan(_parse_loose(text))
+    return plan if is_valid_plan(plan) else None
@@ -0,0 +1,129 @@
+# api_quota.py
+
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from metrics import Counter, Gauge
+
+USAGE_FILE = "api_usage.json"
+DAILY_LIMIT = 100
+THRESHOLD = 98  # Stop at 98 to keep buffer
+
+# Counts live in memory; the file is rewritten atomically once FLUSH_BATCH
+# calls are pending, every FLUSH_INTERVAL seconds, and on shutdown.
+FLUSH_BATCH = 10
+FLUSH_INTERVAL = 5.0
+
+class QuotaExceeded(Exception):
+    def __init__(self, message: str = "Today's API call quota has been reached. Try again tomorrow."):
+        super().__init__(message)
+
+def _next_midnight() -> float:
+    tomorrow = datetime.today().date() + timedelta(days=1)
+    return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+
+class UsageCounter:
+    """Daily Atomberg call counter that is safe to use from concurrent requests"""
+
+    def __init__(self, path: str = USAGE_FILE, threshold: int = THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.date = None
+        self.count = 0
+        self._rollover_at = 0.0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def _load(self):
+        today = datetime.today().strftime("%Y-%m-%d")
+        self.date, self.count = today, 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                if data.get("date") == today:
+                    self.count = int(data.get("count", 0))
+            except Exception as e:
+                print(f"[USAGE LOAD ERROR]: {e}")
+        self._rollover_at = _next_midnight()
+
+    def _roll(self):
+        # Called with the lock held; loads lazily and resets at midnight
+        if self.date is None:
+            self._load()
+        elif time.time() >= self._rollover_at:
+            self.date = datetime.today().strftime("%Y-%m-%d")
+            self.count = 0
+            self._rollover_at = _next_midnight()
+            self._pending += 1
+
+    def used(self) -> int:
+        with self._lock:
+            self._roll()
+            return self.count
+
+    def try_consume(self, n: int = 1) -> bool:
+        """Atomically reserve n calls; False if that would cross the threshold"""
+        with self._lock:
+            self._roll()
+            if self.count + n > self.threshold:
+                return False
+            self.count += n
+            self._pending += n
+            flush_now = self._pending >= FLUSH_BATCH
+        if flush_now:
+            self.flush()
+        return True
+
+    def flush(self):
+        with self._lock:
+            if not self._pending or self.date is None:
+                return
+            data = {"date": self.date, "count": self.count}
+            self._pending = 0
+            tmp_file = f"{self.path}.tmp"
+            try:
+                with open(tmp_file, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_file, self.path)
+            except OSError as e:
+                self._pending += 1
+                print(f"[USAGE SAVE ERROR]: {e}")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def start(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        self.flush()
+
+usage = UsageCounter()
+# Last-chance flush for processes that exit without running the app lifespan
+atexit.register(usage.flush)
+
+quota_used = Gauge("atomberg_quota_used", "Atomberg API calls made today", function=lambda: usage.used())
+quota_threshold = Gauge("atomberg_quota_threshold", "Atomberg calls allowed per day", function=lambda: usage.threshold)
+quota_refused_total = Counter("atomberg_quota_refused_total", "Calls refused because the daily quota was reached")
+
+def try_consume_quota() -> bool:
+    if usage.try_consume():
+        return True
+    quota_refused_total.inc()
+    return False
@@ -0,0 +1,81 @@
+# device_registry.py
+
+import asyncio
+import json
+import os
+import time
+from bridge import get_devices as fetch_devices
+from metrics import cache_lookups_total
+
+# The device list changes rarely, so it is cached for a long time and kept on
+# disk to survive restarts. Call refresh() after adding or removing a fan.
+REGISTRY_FILE = "device_registry.json"
+REGISTRY_TTL = float(os.getenv("DEVICE_REGISTRY_TTL", str(7 * 24 * 3600)))
+
+_devices = None  # last get_list_of_devices response
+_fetched_at = 0.0  # wall clock, so it stays meaningful across restarts
+_loaded = False
+_refresh_lock = asyncio.Lock()
+
+def _load():
+    global _devices, _fetched_at, _loaded
+
+    _loaded = True
+    if not os.path.exists(REGISTRY_FILE):
+        return
+    try:
+        with open(REGISTRY_FILE, 'r') as f:
+            data = json.load(f)
+        _devices = data["devices"]
+        _fetched_at = float(data["fetched_at"])
+    except Exception as e:
+        print(f"[REGISTRY LOAD ERROR]: {e}")
+
+def _save():
+    tmp_file = f"{REGISTRY_FILE}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({"fetched_at": _fetched_at, "devices": _devices}, f)
+    os.replace(tmp_file, REGISTRY_FILE)
+
+def is_fresh() -> bool:
+    if not _loaded:
+        _load()
+    return _devices is not None and time.time() - _fetched_at < REGISTRY_TTL
+
+async def refresh():
+    """Fetch the device list from the cloud and persist it"""
+    global _devices, _fetched_at
+
+    _devices = await fetch_devices()
+    _fetched_at = time.time()
+    try:
+        _save()
+    except OSError as e:
+        print(f"[REGISTRY SAVE ERROR]: {e}")
+    return _devices
+
+async def get_devices():
+    if is_fresh():
+        cache_lookups_total.inc(cache="registry", result="hit")
+        return _devices
+    cache_lookups_total.inc(cache="registry", result="miss")
+    async with _refresh_lock:
+        # Another request may have refreshed while we waited
+        if is_fresh():
+            return _devices
+        return await refresh()
+
+def _devices_list(data) -> list:
+    message = data.get("message") if isinstance(data, dict) else None
+    devices = message.get("devices_list") if isinstance(message, dict) else None
+    return devices if isinstance(devices, list) else []
+
+async def list_devices() -> list:
+    """The devices_list entries from the registry"""
+    return _devices_list(await get_devices())
+
+def cached_devices() -> list:
+    """Whatever devices_list is held locally, even if stale; never hits the network"""
+    if not _loaded:
+        _load()
+    return _devices_list(_devices)
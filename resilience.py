@@ -0,0 +1,200 @@
+# bridge_resilience.py
+
+import math
+import os
+import random
+import time
+from collections import deque
+import httpx
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "2"))  # retries after the first try
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.2"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "2.0"))
+RETRY_DEADLINE = float(os.getenv("RETRY_DEADLINE", "10.0"))  # no retry starts after this many seconds
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30.0"))
+
+# Worth another try; 429 also tells us the cloud did not act on the request
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Counted against the upstream's health; 4xx other than 429 are our fault, not its
+FAILURE_STATUSES = {500, 502, 503, 504}
+# Raised before the request was written, so even a write can be sent again
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Status codes the Atomberg cloud uses when a device is being hit too fast
+THROTTLE_STATUSES = {429, 503}
+
+def is_throttled(outcome) -> bool:
+    """Whether an attempt's outcome says to slow down: a throttle status or a timeout"""
+    if isinstance(outcome, httpx.Response):
+        return outcome.status_code in THROTTLE_STATUSES
+    return isinstance(outcome, httpx.TimeoutException)
+
+def _retry_after(value) -> float:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+class RetryPolicy:
+    """Bounded exponential backoff with full jitter.
+
+    Idempotent calls (reads, and commands that set absolute values) retry on
+    any transport error or RETRY_STATUSES. Other writes only retry when the
+    cloud cannot have acted on them: a connection that never opened, or a 429.
+    Callers that pace their own requests pass retry_throttled=False so every
+    throttle signal (429, 503 or a timeout) reaches their pacer instead of
+    being retried here behind its back.
+    """
+
+    def __init__(self, attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY, deadline=RETRY_DEADLINE):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def is_retryable(self, outcome, idempotent: bool, retry_throttled: bool = True) -> bool:
+        """`outcome` is the httpx.Response or the exception the attempt ended with"""
+        if not retry_throttled and is_throttled(outcome):
+            return False
+        if isinstance(outcome, httpx.Response):
+            if outcome.status_code == 429:
+                return True
+            return idempotent and outcome.status_code in RETRY_STATUSES
+        if isinstance(outcome, NOT_SENT_ERRORS):
+            return True
+        return idempotent and isinstance(outcome, httpx.TransportError)
+
+    def delay(self, attempt: int, outcome=None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if isinstance(outcome, httpx.Response):
+            retry_after = _retry_after(outcome.headers.get("Retry-After"))
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def next_delay(self, attempt: int, started: float, outcome, idempotent: bool, retry_throttled: bool = True):
+        """Seconds to wait before retry number attempt + 1, or None to give up"""
+        if attempt >= self.attempts or not self.is_retryable(outcome, idempotent, retry_throttled):
+            return None
+        delay = self.delay(attempt, outcome)
+        if time.monotonic() - started + delay > self.deadline:
+            return None
+        return delay
+
+class CircuitBreaker:
+    """Fails fast after `failure_threshold` consecutive upstream failures.
+
+    While open every call is refused for `reset_timeout` seconds; then one
+    probe is let through (half-open). Its success closes the circuit again,
+    its failure reopens it for another `reset_timeout`.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        # Half-open: one probe at a time; a probe that never reported back expires
+        now = time.monotonic()
+        if self._probe_started is None or now - self._probe_started >= self.reset_timeout:
+            self._probe_started = now
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.state == self.HALF_OPEN:
+                print(f"[CIRCUIT OPEN]: {self.failures} consecutive Atomberg failures")
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+
+    def record(self, outcome):
+        """Update health from an httpx.Response or the exception an attempt raised"""
+        if isinstance(outcome, httpx.Response) and outcome.status_code not in FAILURE_STATUSES:
+            self.record_success()
+        elif isinstance(outcome, (httpx.Response, httpx.TransportError)):
+            self.record_failure()
+
+retry_policy = RetryPolicy()
+circuit_breaker = CircuitBreaker()
+
+# Hedged device-state reads, off unless STATE_HEDGING=1
+STATE_HEDGING = os.getenv("STATE_HEDGING", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_WINDOW = 200  # recent read latencies the threshold is learned from
+HEDGE_MIN_SAMPLES = 20  # no hedging until the threshold means something
+HEDGE_MIN_DELAY = 0.05
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.05"))  # hedges per read, long run
+HEDGE_BURST = 5.0
+
+class HedgePolicy:
+    """Decides when a slow read earns a second, hedged request.
+
+    The hedge delay is the `percentile` of recent read latencies, so only the
+    slowest few percent of reads are duplicated. Each read adds `max_ratio` to a
+    budget capped at `burst` and each hedge spends 1, which keeps hedges below
+    `max_ratio` of reads even when the cloud as a whole slows down.
+    """
+
+    def __init__(
+        self,
+        enabled=STATE_HEDGING,
+        percentile=HEDGE_PERCENTILE,
+        window=HEDGE_WINDOW,
+        min_samples=HEDGE_MIN_SAMPLES,
+        min_delay=HEDGE_MIN_DELAY,
+        max_ratio=HEDGE_MAX_RATIO,
+        burst=HEDGE_BURST
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self._latencies = deque(maxlen=window)
+        self._budget = burst
+
+    def record(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def delay(self):
+        """Seconds to wait before hedging the next read, or None to not hedge it"""
+        self._budget = min(self.burst, self._budget + self.max_ratio)
+        if not self.enabled or len(self._latencies) < self.min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        rank = max(1, min(len(latencies), math.ceil(self.percentile / 100 * len(latencies))))
+        return max(self.min_delay, latencies[rank - 1])
+
+    def try_acquire(self) -> bool:
+        if self._budget < 1:
+            return False
+        self._budget -= 1
+        return True
+
+hedge_policy = HedgePolicy()
@@ -0,0 +1,99 @@
+# response_templates.py
+
+from plan_cache import normalize_query
+
+# Romanized Hindi words that mark a query as Hindi or Hinglish
+HINDI_WORDS = {
+    "pankha", "karo", "kar", "kare", "karna", "do", "de", "dena", "ki", "ka", "ke", "ko", "band",
+    "chalu", "jalao", "bujhao", "lagao", "ghante", "ghanta", "batti", "badhao", "kam", "tez",
+    "aur", "hai", "kya", "kitna", "kitni", "pe", "par", "zara", "abhi"
+}
+# English words that turn a Hindi sentence into Hinglish
+ENGLISH_WORDS = {"fan", "on", "off", "turn", "switch", "set", "start", "stop"}
+QUESTION_WORDS = {"what", "which", "how", "is", "status", "kya", "kitna", "kitni", "kaun", "kaisa", "batao", "bata"}
+
+TEMPLATES = {
+    "english": {
+        ("power", True): "Fan turned on.",
+        ("power", False): "Fan turned off.",
+        "speed": "Fan speed set to {value}.",
+        ("led", True): "Fan light turned on.",
+        ("led", False): "Fan light turned off.",
+        "brightness": "Brightness set to {value} percent.",
+        "light_mode": "Light {value} mode on.",
+        ("timer", 0): "Timer turned off.",
+        "timer": "Timer set to {value}.",
+        ("sleep", True): "Sleep mode turned on.",
+        ("sleep", False): "Sleep mode turned off."
+    },
+    "hindi": {
+        ("power", True): "Pankha chalu ho gaya.",
+        ("power", False): "Pankha band ho gaya.",
+        "speed": "Speed {value} set ho gayi.",
+        ("led", True): "Pankhe ki light chalu ho gayi.",
+        ("led", False): "Pankhe ki light band ho gayi.",
+        "brightness": "Brightness {value} percent ho gayi.",
+        "light_mode": "Light {value} mode chalu.",
+        ("timer", 0): "Timer band ho gaya.",
+        "timer": "Timer {value} par lag gaya.",
+        ("sleep", True): "Sleep mode chalu ho gaya.",
+        ("sleep", False): "Sleep mode band ho gaya."
+    },
+    "hinglish": {
+        ("power", True): "Fan on ho gaya.",
+        ("power", False): "Fan off ho gaya.",
+        "speed": "Fan speed {value} ho gayi.",
+        ("led", True): "Fan ki light on ho gayi.",
+        ("led", False): "Fan ki light off ho gayi.",
+        "brightness": "Brightness {value} percent ho gayi.",
+        "light_mode": "Light {value} mode on ho gaya.",
+        ("timer", 0): "Timer off ho gaya.",
+        "timer": "Timer {value} set ho gaya.",
+        ("sleep", True): "Sleep mode on ho gaya.",
+        ("sleep", False): "Sleep mode off ho gaya."
+    }
+}
+
+def detect_language(query: str) -> str:
+    """Classify a query as english, hindi or hinglish"""
+    if any("ऀ" <= ch <= "ॿ" for ch in query):
+        return "hindi"
+    words = set(normalize_query(query).split())
+    if not words & HINDI_WORDS:
+        return "english"
+    return "hinglish" if words & ENGLISH_WORDS else "hindi"
+
+def _template(language: str, key: str, value):
+    templates = TEMPLATES[language]
+    if isinstance(value, bool) or (key, value) in templates:
+        return templates.get((key, value))
+    template = templates.get(key)
+    return template.format(value=value) if template else None
+
+def render_confirmation(query: str, commands: list):
+    """Confirm executed commands in the query's language without calling the LLM.
+
+    `commands` are the command dicts that were sent successfully. Returns None
+    for questions, read-only plans or keys without a template, so the caller
+    can fall back to the LLM summary.
+    """
+    if not commands or "?" in query or set(normalize_query(query).split()) & QUESTION_WORDS:
+        return None
+
+    merged = {}
+    for command in commands:
+        merged.update(command)
+    # Powering on before a speed or light change is implied, only confirm what was asked
+    if "speed" in merged and merged.get("power") is True:
+        del merged["power"]
+    if ("brightness" in merged or "light_mode" in merged) and merged.get("led") is True:
+        del merged["led"]
+
+    language = detect_language(query)
+    sentences = []
+    for key, value in merged.items():
+        sentence = _template(language, key, value)
+        if sentence is None:
+            return None
+        sentences.append(sentence)
+    return " ".join(sentences)
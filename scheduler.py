@@ -0,0 +1,113 @@
+# plan_scheduler.py
+
+import asyncio
+import os
+
+MAX_PARALLEL_STEPS = int(os.getenv("MAX_PARALLEL_STEPS", "4"))
+WRITE_FUNCTIONS = {"send_command", "send_command_many"}
+
+class StepSkipped(Exception):
+    """A step was not started because an earlier-finishing step failed"""
+
+def step_device(task: dict):
+    """Device a step touches, "all" for every device, or None for none"""
+    func = task.get("function")
+    params = task.get("params") or {}
+    if func == "get_device_state":
+        return params.get("device_id", "all")
+    if func == "send_command_many":
+        # Targets are resolved at run time, so treat them as every device
+        return "all"
+    if func in WRITE_FUNCTIONS:
+        return params.get("device_id")
+    return None
+
+def _conflicts(a: dict, b: dict) -> bool:
+    if a.get("function") not in WRITE_FUNCTIONS and b.get("function") not in WRITE_FUNCTIONS:
+        return False
+    device_a, device_b = step_device(a), step_device(b)
+    if device_a is None or device_b is None:
+        return False
+    return device_a == device_b or "all" in (device_a, device_b)
+
+def step_dependencies(plan: list) -> list:
+    """For each step, the indexes of earlier steps it must wait for.
+
+    Reads never wait on reads. A write waits for every earlier read or write on
+    the same device, and a read waits for earlier writes to the device it reads,
+    so per-device order is exactly the plan order.
+    """
+    return [
+        {j for j in range(i) if _conflicts(plan[j], task)}
+        for i, task in enumerate(plan)
+    ]
+
+def plans_conflict(first: list, second: list) -> bool:
+    """Whether two plans touch a common device and at least one of them writes to it"""
+    return any(_conflicts(a, b) for a in first for b in second)
+
+async def run_plan(plan: list, execute, max_parallel: int = MAX_PARALLEL_STEPS):
+    """Execute plan steps concurrently where it is safe to.
+
+    `execute` is awaited with each step. Yields (index, result, error) in plan
+    order as soon as every earlier step has finished. After the first error no
+    new steps are started, but steps already running are awaited and their
+    outcomes still yielded, so a write in flight is never abandoned unreported.
+    Steps that were never started are not yielded.
+    """
+    dependencies = step_dependencies(plan)
+    semaphore = asyncio.Semaphore(max_parallel)
+    tasks = []
+    started = set()
+    failure = []  # (index, error) of the first step to fail in time
+    stopping = False
+
+    async def run(index: int):
+        if dependencies[index]:
+            # wait() rather than gather() so cancelling this step never cancels the ones it waits for
+            await asyncio.wait([tasks[j] for j in dependencies[index]])
+        async with semaphore:
+            if failure or stopping:
+                raise StepSkipped()
+            started.add(index)
+            try:
+                return await execute(plan[index])
+            except Exception as e:
+                if not failure:
+                    failure.append((index, e))
+                raise
+
+    for index in range(len(plan)):
+        tasks.append(asyncio.ensure_future(run(index)))
+
+    reported = set()
+    try:
+        for index, task in enumerate(tasks):
+            # wait() so that cancelling the consumer does not cancel a write mid-request
+            await asyncio.wait([task])
+            try:
+                result = task.result()
+            except StepSkipped:
+                # Report the failure that stopped this step once, in its place
+                failed_index, error = failure[0]
+                if failed_index not in reported:
+                    reported.add(failed_index)
+                    yield failed_index, None, error
+                continue
+            except Exception as e:
+                if index not in reported:
+                    reported.add(index)
+                    yield index, None, e
+                continue
+            yield index, result, None
+    finally:
+        # Iteration ended early: start nothing new, but let running steps finish
+        stopping = True
+        for index, task in enumerate(tasks):
+            if index not in started:
+                task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+        for task in tasks:
+            if not task.cancelled():
+                task.exception()  # retrieved, so unreported failures are not logged as lost
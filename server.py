@@ -1,315 +1,461 @@
 # fastapi_server.py
-import time
-import os
+import asyncio
+import copy
 import json
-import openai
+import time
+from contextlib import aclosing, asynccontextmanager
+from typing import Annotated, Literal
 from dotenv import load_dotenv
 from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+import registry
 from bridge import (
+    AtombergAPIError,
+    cached_device_state,
+    cached_state,
+    close_client,
     get_access_token,
-    get_devices,
     get_device_state,
-    send_command
+    send_command,
+    token_manager
+)
+from pacing import pacer
+from quota import QuotaExceeded, usage
+from plan_optimizer import add_preconditions, coalesce_commands, optimize_plan
+from plan_schema import PLAN_RESPONSE_FORMAT, extract_plan, normalize_command
+from plan_cache import normalize_query, plan_cache
+from fuzzy_cache import fuzzy_plan_cache, is_relative_query
+from prompts import PROMPT_VERSION, planner_context, summary_prompt, system_prompt
+from intent import DEFAULT_DEVICE_ID, parse_intent
+from fanout import fan_out
+from metrics import (
+    ask_stage_seconds,
+    cache_lookups_total,
+    coalesced_calls_total,
+    llm_request_seconds,
+    plan_source_total,
+    plan_step_seconds,
+    render as render_metrics,
+    skipped_steps_total
+)
+from scheduler import plans_conflict, run_plan, step_device
+from tracing import tracer
+from responses import render_confirmation
+from llm import (
+    MODEL,
+    SUMMARY_TIMEOUT,
+    close_client as close_llm_client,
+    get_client as get_llm_client,
+    record_usage,
+    usage_records,
+    usage_totals
 )
-from datetime import datetime
 load_dotenv()
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fetch the access token up front and keep it renewed ahead of expiry
+    token_manager.start()
+    # Persist quota counts periodically instead of on every call
+    usage.start()
+    yield
+    await token_manager.stop()
+    await usage.stop()
+    # Release pooled Atomberg and OpenAI connections on shutdown
+    await close_client()
+    await close_llm_client()
+
+app = FastAPI(lifespan=lifespan)
 
 class QueryRequest(BaseModel):
     query: str
 
-USAGE_FILE = "api_usage.json"
-DAILY_LIMIT = 100
-THRESHOLD = 98  # Stop at 98 to keep buffer
-
-def load_usage():
-    if not os.path.exists(USAGE_FILE):
-        with open(USAGE_FILE, 'w') as f:
-            json.dump({"date": datetime.today().strftime("%Y-%m-%d"), "count": 0}, f)
-
-    with open(USAGE_FILE, 'r') as f:
-        data = json.load(f)
-
-    today = datetime.today().strftime("%Y-%m-%d")
-    if data["date"] != today:
-        data = {"date": today, "count": 0}
-        with open(USAGE_FILE, 'w') as f:
-            json.dump(data, f)
-
-    return data
-
-def increment_usage():
-    data = load_usage()
-    data["count"] += 1
-    with open(USAGE_FILE, 'w') as f:
-        json.dump(data, f)
-
-def has_quota():
-    data = load_usage()
-    return data["count"] < THRESHOLD
-
-system_prompt = '''
-You are an AI assistant integrated with Atomberg smart fans using FastAPI.
-
-You will receive user queries in ENGLISH, HINDI, or HINGLISH (Hindi-English mix) like:
-- "turn off the fan" / "pankha band karo" / "fan off kar do"
-- "increase speed to 5" / "speed 5 kar do" / "pankhe ki speed badhao"
-- "light on karo" / "led jalao" / "brightness kam kar do"
-
-You must understand the query in ANY language and respond with a **step-by-step list of function calls** in JSON format only:
-
-[
-  {
-    "function": "<function_name>",
-    "params": { <parameters> }
-  },
-  ...
-]
-
----
-
-LANGUAGE UNDERSTANDING EXAMPLES
-
-Hindi/Hinglish Terms:
-- "pankha" = fan
-- "band/off" = turn off  
-- "chalu/on" = turn on
-- "speed badhao/kam karo" = increase/decrease speed
-- "light/led" = fan light
-- "brightness" = brightness
-- "timer lagao" = set timer
-- "sleep mode" = sleep mode
-- "tez/slow" = fast/slow
-
----
-
-BEHAVIOR RULES
-
-1. UNDERSTAND queries in English, Hindi, and Hinglish
-2. Think and break the task into **multiple function calls**, if needed.
-3. Include **state checks** where needed. For example, if speed needs to change and power is OFF, turn ON the fan first.
-4. Always refer to the device_id `"f09e9ef2b640"` unless instructed otherwise.
-5. DO NOT skip steps. AI should reason step-by-step.
-6. If further steps are required, they will be asked in the next user message in the conversation loop.
----
-
-Available Functions
-
-1. get_access_token()
-- Purpose: Fetch new access token
-- Endpoint: GET /token
-- Params: None
-
-2. get_devices()
-- Purpose: Get list of user devices
-- Endpoint: GET /devices
-- Params: None
-
-3. get_device_state(device_id: str)
-- Purpose: Get current state of device
-- Endpoint: GET /state/{device_id}
-- Params: { "device_id": "f09e9ef2b640" }
-
-4. send_command(device_id: str, command: dict)
-- Purpose: Send commands to fan
-- Endpoint: POST /command
-- Params:
-    - device_id: string
-    - command: dict with keys:
-        - power: true/false
-        - speed: 1–6
-        - sleep: true/false
-        - timer: 0–4
-        - led: true/false
-        - brightness: 10–100
-        - light_mode: \"cool\" / \"warm\" / \"daylight\"
-
----
-
-💡 Examples
-
-User: "Set speed to 5" / "speed 5 kar do"
-Response:
-[
-  {
-    "function": "get_devices"
-  },
-  {
-    "function": "get_device_state",
-    "params": {"device_id": "f09e9ef2b640"}
-  },
-  {
-    "function": "send_command",
-    "params": {
-      "device_id": "f09e9ef2b640",
-      "command": {"power": true}
-    }
-  },
-  {
-    "function": "send_command",
-    "params": {
-      "device_id": "f09e9ef2b640",
-      "command": {"speed": 5}
-    }
-  }
-]
-
-User: "pankha band karo" / "fan off kar do"
-Response:
-[
-  {
-    "function": "get_devices"
-  },
-  {
-    "function": "send_command",
-    "params": {
-      "device_id": "f09e9ef2b640",
-      "command": {"power": false}
-    }
-  }
-]
-
----
-
-Only reply with the function call JSON. Do NOT include explanations, do NOT say "done".
-'''
-
-summary_prompt = '''
-You are a concise AI assistant that creates brief status messages for smart fan operations in the SAME LANGUAGE as the user's original query.
-
-IMPORTANT: Your response will be SPOKEN aloud exactly as written. Use ONLY plain text without any:
-- Quotation marks (" ")
-- Backslashes (\)
-- Special characters
-- Escape sequences
-- Formatting symbols
-
-LANGUAGE DETECTION:
-- If user query is in ENGLISH → respond in English
-- If user query is in HINDI → respond in Hindi  
-- If user query is in HINGLISH (mix) → respond in Hinglish
-
-You will receive:
-1. The original user query (in English/Hindi/Hinglish)
-2. A summary of operations performed and their results
-
-Create a SHORT, direct response (maximum 15 words) that:
-- MATCHES the language of the original query
-- Confirms ONLY what the user specifically requested
-- Mentions ONLY the changes directly related to the user's query
-- Ignores unrelated status information unless specifically asked
-- Uses simple, clear language
-- No extra words or pleasantries
-- CLEAN text for speech output
-
-EXAMPLES:
-
-English Query: "Turn off fan light" → "Fan light turned off."
-Hindi Query: "pankhe ki light band karo" → "Pankhe ki light band ho gayi."
-Hinglish Query: "fan ki light off karo" → "Fan ki light off ho gayi."
-
-English Query: "Set speed to 5" → "Fan speed set to 5."
-Hindi Query: "speed 5 kar do" → "Speed 5 set ho gayi."
-Hinglish Query: "fan ki speed 3 karo" → "Fan speed 3 ho gayi."
-
-English Query: "Turn off fan" → "Fan turned off."
-Hindi Query: "pankha band karo" → "Pankha band ho gaya."
-Hinglish Query: "fan off kar do" → "Fan off ho gaya."
-
-English Query: "Light warm mode" → "Light warm mode on."
-Hindi Query: "light warm karo" → "Light warm mode chalu."
-
-English Query: "What is fan name" → "Fan name is Atom Fan."
-Hindi Query: "fan ka naam kya hai" → "Pankhe ka naam Atom Fan hai."
-
-CRITICAL: Only mention what the user specifically asked for. Do NOT include unrelated fan status like speed, power state, etc. unless directly relevant to the request.
-'''
-
-def generate_summary_message(original_query: str, operations_summary: str) -> str:
+MAX_BATCH_QUERIES = 50
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str] = Field(min_length=1, max_length=MAX_BATCH_QUERIES)
+
+def summary_messages(original_query: str, operations_summary: str) -> list:
+    return [
+        {"role": "system", "content": summary_prompt},
+        {"role": "user", "content": f"Original query: {original_query}\n\nOperations summary: {operations_summary}"}
+    ]
+
+async def generate_summary_message(original_query: str, operations_summary: str) -> str:
     """Generate a user-friendly message based on operations performed"""
     try:
-        messages = [
-            {"role": "system", "content": summary_prompt},
-            {"role": "user", "content": f"Original query: {original_query}\n\nOperations summary: {operations_summary}"}
-        ]
-        
-        response = openai.chat.completions.create(
-            model="gpt-4.1-nano",
-            messages=messages,
-            max_tokens=100
-        )
+        with llm_request_seconds.time(stage="summary", outcome="error") as labels:
+            response = await get_llm_client().chat.completions.create(
+                model=MODEL,
+                messages=summary_messages(original_query, operations_summary),
+                max_tokens=100,
+                timeout=SUMMARY_TIMEOUT
+            )
+            labels["outcome"] = "ok"
+        record_usage("summary", response.usage, PROMPT_VERSION)
         
         return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"[SUMMARY GENERATION ERROR]: {e}")
         return "Operation completed successfully."
 
-@app.post("/ask")
-async def ask_atomberg_ai(payload: QueryRequest):
-    user_query = payload.query
-    operations_log = []  # Track all operations and their results
+async def stream_summary_message(original_query: str, operations_summary: str):
+    """Same as generate_summary_message, but yields the text as it is generated"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        stream = await get_llm_client().chat.completions.create(
+            model=MODEL,
+            messages=summary_messages(original_query, operations_summary),
+            max_tokens=100,
+            timeout=SUMMARY_TIMEOUT,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.usage is not None:
+                record_usage("summary", chunk.usage, PROMPT_VERSION)
+        outcome = "ok"
+    except Exception as e:
+        print(f"[SUMMARY GENERATION ERROR]: {e}")
+        yield "Operation completed successfully."
+    finally:
+        llm_request_seconds.observe(time.perf_counter() - started, stage="summary_stream", outcome=outcome)
+
+class RoomTarget(BaseModel):
+    room: str = Field(min_length=1)
+
+class FanOutRequest(BaseModel):
+    target: Literal["all"] | Annotated[list[str], Field(min_length=1)] | RoomTarget
+    command: dict
+
+@app.post("/devices/command")
+async def command_devices(payload: FanOutRequest):
+    """Apply one command to all devices, a room ({"room": name}) or a list of ids"""
+    # Keys the fans do not understand would only buy one 400 per device
+    command = normalize_command(payload.command)
+    if not command:
+        return JSONResponse(status_code=422, content={"message": "No valid command keys given."})
+    target = payload.target.model_dump() if isinstance(payload.target, RoomTarget) else payload.target
+    try:
+        return await fan_out(target, command)
+    except (QuotaExceeded, AtombergAPIError, ValueError) as e:
+        return {"message": str(e)}
+
+@app.get("/llm/usage")
+async def llm_usage():
+    """Token usage per LLM stage, for watching planning cost across prompt changes"""
+    return {"prompt_version": PROMPT_VERSION, "totals": usage_totals, "recent": list(usage_records)[-20:]}
 
+@app.post("/devices/refresh")
+async def refresh_devices():
+    try:
+        return await registry.refresh()
+    except QuotaExceeded as e:
+        return {"message": str(e)}
+
+async def plan_query(user_query: str):
+    """Return the function-call plan for a query, or None if it could not be parsed"""
+    # Simple commands are parsed locally; the LLM only sees what the rules do not cover
+    local_plan = parse_intent(user_query)
+    if local_plan is not None:
+        plan_source_total.inc(source="intent")
+        tracer.set_attribute("source", "intent")
+        return local_plan
+
+    # "speed badhao" is planned from the current state, so its plan goes stale with it
+    cacheable = not is_relative_query(user_query)
+    if cacheable:
+        cached = plan_cache.get(user_query)
+        cache_lookups_total.inc(cache="plan", result="miss" if cached is None else "hit")
+        if cached is not None:
+            plan_source_total.inc(source="plan_cache")
+            tracer.set_attribute("source", "plan_cache")
+            return cached
+        # Misspelt repeats ("pnkha band kro") reuse a plan when the slots agree
+        cached = fuzzy_plan_cache.get(user_query)
+        cache_lookups_total.inc(cache="fuzzy_plan", result="miss" if cached is None else "hit")
+        if cached is not None:
+            plan_source_total.inc(source="fuzzy_plan_cache")
+            tracer.set_attribute("source", "fuzzy_plan_cache")
+            return cached
+
+    # Static prompt first so its prefix is cached, then what varies per request
+    devices = registry.cached_devices()
+    states = {}
+    for device in devices:
+        state = cached_state(device.get("device_id"))
+        if state is not None:
+            states[device["device_id"]] = state
     messages = [
         {"role": "system", "content": system_prompt},
+        {"role": "system", "content": planner_context(DEFAULT_DEVICE_ID, devices, states)},
         {"role": "user", "content": user_query}
     ]
 
     # Get AI response with function calls
-    response = openai.chat.completions.create(
-        model="gpt-4.1-nano",
-        messages=messages
-    )
+    with llm_request_seconds.time(stage="plan", outcome="error") as labels, tracer.span("llm.plan", model=MODEL) as span:
+        response = await get_llm_client().chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            response_format=PLAN_RESPONSE_FORMAT
+        )
+        labels["outcome"] = "ok"
 
     ai_response = response.choices[0].message.content
+    record = record_usage("plan", response.usage, PROMPT_VERSION)
+    if record is not None:
+        span.set_attribute("prompt_tokens", record["prompt_tokens"])
+        span.set_attribute("completion_tokens", record["completion_tokens"])
+
+    # Schema output is normally clean, but fences, comments and stray prose are repaired locally
+    parsed = extract_plan(ai_response)
+    if parsed is None:
+        print(f"[AI PARSE ERROR]: no valid plan in {ai_response!r}")
+        plan_source_total.inc(source="unparsed")
+        tracer.set_attribute("source", "unparsed")
+        return None
+
+    plan_source_total.inc(source="llm")
+    tracer.set_attribute("source", "llm")
+    # The planner saw the last known state; make sure the plan does not rely on it
+    parsed = add_preconditions(parsed)
+    if cacheable:
+        plan_cache.put(user_query, parsed)
+        fuzzy_plan_cache.put(user_query, parsed)
+    return parsed
+
+async def execute_step(task: dict) -> tuple:
+    """Run one plan step and return its operations log line and how many devices it failed on"""
+    func = task.get("function")
+    with plan_step_seconds.time(function=func, outcome="error") as labels, tracer.span(func, params=task.get("params", {})):
+        result = await _execute_step(task)
+        labels["outcome"] = "ok"
+    return result
+
+async def _execute_step(task: dict) -> tuple:
+    func = task.get("function")
+    params = task.get("params", {})
+
+    # Quota is charged by the bridge for each call that actually reaches the cloud
+    if func == "get_access_token":
+        # Never leak the token into the summary prompt
+        await get_access_token()
+        return "Retrieved access token", 0
+    elif func == "get_devices":
+        result = await registry.get_devices()
+        return f"Retrieved devices: {result}", 0
+    elif func == "get_device_state":
+        result = await get_device_state(**params)
+        return f"Retrieved device state: {result}", 0
+    elif func == "send_command":
+        # Only writes to the same device are spaced out; reads go straight through
+        result = await pacer.run(params.get("device_id"), lambda: send_command(**params))
+        command_desc = ", ".join([f"{k}: {v}" for k, v in params.get('command', {}).items()])
+        return f"Sent command ({command_desc}): {result}", 0
+    elif func == "send_command_many":
+        result = await fan_out(params.get("target"), params.get("command", {}))
+        if not result["succeeded"]:
+            raise Exception(f"Failed to send command to {result['failed']} device(s)")
+        command_desc = ", ".join([f"{k}: {v}" for k, v in params.get('command', {}).items()])
+        log_line = f"Sent command ({command_desc}) to {len(result['devices'])} device(s), {result['failed']} failed: {result['devices']}"
+        return log_line, result["failed"]
+    else:
+        return f"Unknown function: {func}", 0
+
+async def ask_events(user_query: str, stream_summary: bool = False, plan: list = None):
+    """Run one query, yielding (event, data) pairs as each stage completes.
+
+    Emits "plan" once the plan is ready, "step" after every executed call,
+    "token" for summary text when stream_summary is set, and always ends with
+    a "message" event carrying the final reply. Pass `plan` to skip planning.
+    """
+    operations_log = []  # Track all operations and their results
+    sent_commands = []  # Commands the cloud accepted, for the confirmation message
+    partial_failure = False  # Some fan-out devices failed; only the LLM summary can say which
+
+    with tracer.span("ask", query=user_query, stream=stream_summary) as trace:
+        if plan is None:
+            try:
+                with ask_stage_seconds.time(stage="plan"), tracer.span("plan"):
+                    plan = await plan_query(user_query)
+            except Exception as e:
+                # OpenAI timeouts and API errors still end the request with a reply
+                print(f"[PLANNING ERROR]: {e}")
+                plan = None
+        parsed = plan
+        if parsed is None:
+            trace.fail("no plan")
+            yield "message", {"message": "something went wrong. try again"}
+            return
+
+        started = time.perf_counter()
+        parsed, saved_calls = coalesce_commands(parsed)
+        coalesced_calls_total.inc(saved_calls)
+        parsed, skipped = optimize_plan(parsed, token_manager.is_valid(), cached_state)
+        for task, reason in skipped:
+            skipped_steps_total.inc(reason=reason)
+            if task.get("function") == "send_command":
+                # Already in the requested state, still worth confirming to the user
+                sent_commands.append(task["params"]["command"])
+        ask_stage_seconds.observe(time.perf_counter() - started, stage="optimize")
+        trace.set_attribute("plan.steps", len(parsed))
+        trace.set_attribute("plan.skipped", len(skipped))
+        trace.set_attribute("plan.saved_calls", saved_calls)
+        yield "plan", {
+            "steps": parsed,
+            "saved_calls": saved_calls,
+            "skipped": [{"step": task, "reason": reason} for task, reason in skipped]
+        }
+
+        # Execute the plan, independent reads concurrently, and log operations in plan order
+        started = time.perf_counter()
+        first_error = None
+        with tracer.span("execute") as execute_span:
+            async with aclosing(run_plan(parsed, execute_step)) as results:
+                async for index, result, error in results:
+                    task = parsed[index]
+                    func = task.get("function")
+                    params = task.get("params", {})
+                    if error is not None:
+                        operations_log.append(f"Error in {func}: {str(error)}")
+                        if first_error is None:
+                            first_error = error
+                            execute_span.fail(f"{func}: {error}")
+                        continue
+                    # Steps already running when another failed still report their outcome
+                    result, failed_devices = result
+                    operations_log.append(result)
+                    if failed_devices:
+                        partial_failure = True
+                    elif func in ("send_command", "send_command_many"):
+                        sent_commands.append(params.get('command', {}))
+                    yield "step", {"function": func, "params": params, "result": result}
+
+        ask_stage_seconds.observe(time.perf_counter() - started, stage="execute")
+        if first_error is not None:
+            trace.fail(str(first_error))
+            yield "message", {"message": f"{str(first_error)}"}
+            return
+
+        # Create operations summary
+        operations_summary = " | ".join(operations_log)
+        
+        # Generate user-friendly message, from templates when the outcome is a plain command
+        started = time.perf_counter()
+        with tracer.span("summary") as summary_span:
+            final_message = None if partial_failure else render_confirmation(user_query, sent_commands)
+            summary_span.set_attribute("source", "template" if final_message is not None else "llm")
+            if final_message is None and stream_summary:
+                parts = []
+                async for text in stream_summary_message(user_query, operations_summary):
+                    parts.append(text)
+                    yield "token", {"text": text}
+                final_message = "".join(parts).strip()
+            elif final_message is None:
+                final_message = await generate_summary_message(user_query, operations_summary)
+        ask_stage_seconds.observe(time.perf_counter() - started, stage="summary")
+        
+        trace.set_attribute("reply", final_message)
+        yield "message", {"message": final_message}
+
+async def final_reply(events) -> dict:
+    reply = None
+    async for event, data in events:
+        if event == "message":
+            reply = data
+    return reply
+
+@app.post("/ask")
+async def ask_atomberg_ai(payload: QueryRequest):
+    with ask_stage_seconds.time(stage="total"):
+        return await final_reply(ask_events(payload.query))
+
+@app.get("/debug/traces")
+async def debug_traces(limit: int = 20):
+    """Span trees of the most recent requests, newest first"""
+    return {"traces": tracer.traces(limit)}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage and upstream latency histograms, quota gauges and cache counters for Prometheus"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+async def prefetch_shared_state(plans: list):
+    """Fetch what several plans will read once, so each plan hits the caches"""
+    if any(step.get("function") == "get_devices" for plan in plans for step in plan) and not registry.is_fresh():
+        await registry.get_devices()
+
+    devices = {
+        step_device(step) for plan in plans for step in plan
+        if step.get("function") in ("get_device_state", "send_command")
+    } - {None}
+    missing = {device_id for device_id in devices if cached_device_state(device_id) is None}
+    if len(missing) > 1 or "all" in missing:
+        # One bulk read fills every device's cache entry for the same quota unit
+        missing = {"all"}
+    for device_id in missing:
+        await get_device_state(device_id)
+
+@app.post("/ask/batch")
+async def ask_atomberg_ai_batch(payload: BatchQueryRequest):
+    """Run many queries in one request and return a reply for each, in order"""
+    queries = payload.queries
+
+    # Plan each distinct query once, all concurrently
+    planning = {}
+    with tracer.span("plan_batch", queries=len(queries)):
+        for query in queries:
+            key = normalize_query(query)
+            if key not in planning:
+                planning[key] = asyncio.ensure_future(plan_query(query))
+        await asyncio.gather(*planning.values(), return_exceptions=True)
+
+    plans = []
+    for query in queries:
+        task = planning[normalize_query(query)]
+        plan = None if task.exception() is not None else task.result()
+        if not isinstance(plan, list) or not all(isinstance(step, dict) for step in plan):
+            plan = None
+        plans.append(copy.deepcopy(plan))
 
     try:
-        parsed = json.loads(ai_response)
+        await prefetch_shared_state([plan for plan in plans if plan])
     except Exception as e:
-        print(f"[AI PARSE ERROR]: {e}")
-        return {"message": "something went wrong. try again"}
-
-    # Execute all function calls and log operations
-    for task in parsed:
-        func = task.get("function")
-        params = task.get("params", {})
-        
-        if func in ["get_access_token", "get_devices", "get_device_state", "send_command"]:
-            if not has_quota():
-                return {"message": "Today's API call quota has been reached. Try again tomorrow."}
-            increment_usage()
-        
-        try:
-            if func == "get_access_token":
-                result = get_access_token()
-                operations_log.append(f"Retrieved access token: {result}")
-                time.sleep(0.4)
-            elif func == "get_devices":
-                result = get_devices()
-                operations_log.append(f"Retrieved devices: {result}")
-                time.sleep(0.4)
-            elif func == "get_device_state":
-                result = get_device_state(**params)
-                operations_log.append(f"Retrieved device state: {result}")
-                time.sleep(0.4)
-            elif func == "send_command":
-                result = send_command(**params)
-                command_desc = ", ".join([f"{k}: {v}" for k, v in params.get('command', {}).items()])
-                operations_log.append(f"Sent command ({command_desc}): {result}")
-                time.sleep(0.4)
-            else:
-                operations_log.append(f"Unknown function: {func}")
-        except Exception as e:
-            operations_log.append(f"Error in {func}: {str(e)}")
-            return {"message": f"{str(e)}"}
-
-    # Create operations summary
-    operations_summary = " | ".join(operations_log)
-    
-    # Generate user-friendly message
-    final_message = generate_summary_message(user_query, operations_summary)
-    
-    return {"message": final_message}
\ No newline at end of file
+        # Not fatal, each query still fetches what it needs
+        print(f"[BATCH PREFETCH ERROR]: {e}")
+
+    # Queries run concurrently unless they write to a device an earlier query touches
+    tasks = []
+
+    async def run(index: int):
+        waits = [tasks[j] for j in range(index) if plans[j] and plans[index] and plans_conflict(plans[j], plans[index])]
+        await asyncio.gather(*waits, return_exceptions=True)
+        if plans[index] is None:
+            return {"message": "something went wrong. try again"}
+        return await final_reply(ask_events(queries[index], plan=plans[index]))
+
+    for index in range(len(queries)):
+        tasks.append(asyncio.ensure_future(run(index)))
+    replies = await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {"results": [
+        {"query": query, "message": reply["message"] if isinstance(reply, dict) else str(reply)}
+        for query, reply in zip(queries, replies)
+    ]}
+
+@app.post("/ask/stream")
+async def ask_atomberg_ai_stream(payload: QueryRequest):
+    """Server-sent-event version of /ask for clients that speak while we work"""
+    async def event_stream():
+        async for event, data in ask_events(payload.query, stream_summary=True):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,10 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(autouse=True)
+def isolated_cwd(tmp_path, monkeypatch):
+    # api_usage.json and device_registry.json are relative paths
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,113 @@
+import asyncio
+import httpx
+import pytest
+import bridge
+import quota
+from pacing import DevicePacer
+from quota import QuotaExceeded, UsageCounter
+from resilience import CircuitBreaker, RetryPolicy
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Route the shared client to a handler answering from `statuses`, in order"""
+    calls = []
+    statuses = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(statuses.pop(0) if statuses else 200, json={"message": {"access_token": "token"}})
+
+    monkeypatch.setattr(bridge, "_client", httpx.AsyncClient(base_url="http://atomberg.test", transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(bridge, "circuit_breaker", CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    monkeypatch.setattr(bridge, "retry_policy", RetryPolicy(attempts=2, base_delay=0, max_delay=0))
+    monkeypatch.setattr(quota, "usage", UsageCounter("usage.json", threshold=10))
+    return calls, statuses
+
+def request(*args, **kwargs):
+    return asyncio.run(bridge._request(*args, **kwargs))
+
+def test_each_sent_attempt_is_charged(upstream):
+    calls, statuses = upstream
+    statuses.extend([503, 200])
+    assert request("GET", "/get_device_state").status_code == 200
+    assert len(calls) == 2
+    assert quota.usage.used() == 2
+
+def test_calls_refused_by_the_breaker_are_not_charged(upstream):
+    calls, statuses = upstream
+    statuses.extend([500, 500, 500])
+    # The breaker opens after two failures, so the last retry is never sent
+    with pytest.raises(bridge.CircuitOpenError):
+        request("GET", "/get_device_state")
+    for _ in range(5):
+        with pytest.raises(bridge.CircuitOpenError):
+            request("POST", "/send_command")
+    assert len(calls) == 2
+    assert quota.usage.used() == 2
+
+def test_no_quota_left(upstream):
+    calls, statuses = upstream
+    quota.usage.threshold = 1
+    statuses.append(503)
+    # The retry cannot be charged, so the first attempt's outcome is reported
+    assert request("GET", "/get_device_state").status_code == 503
+    with pytest.raises(QuotaExceeded):
+        request("GET", "/get_device_state")
+    assert len(calls) == 1
+
+def run_refresher(seconds: float, before_stop=None):
+    async def main():
+        manager = bridge.TokenManager()
+        manager.start()
+        await asyncio.sleep(seconds)
+        if before_stop is not None:
+            await before_stop(manager)
+        await manager.stop()
+        return manager
+    return asyncio.run(main())
+
+@pytest.fixture
+def token_upstream(upstream, monkeypatch):
+    monkeypatch.setattr(bridge, "API_KEY", "key")
+    monkeypatch.setattr(bridge, "REFRESH_TOKEN", "refresh")
+    monkeypatch.setattr(bridge, "TOKEN_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(bridge, "TOKEN_RETRY_MAX_DELAY", 0.04)
+    return upstream
+
+def test_refresher_backs_off_during_an_outage(token_upstream):
+    calls, statuses = token_upstream
+    bridge.retry_policy.attempts = 0
+    bridge.circuit_breaker.failure_threshold = 100
+    statuses.extend([500] * 100)
+    run_refresher(0.2)
+    # 0, 0.01, 0.02, then every 0.04s; a fixed 0.01s delay would have made about 20 calls
+    assert 4 <= len(calls) <= 8
+    assert quota.usage.used() == len(calls)
+
+def test_refresher_stops_after_the_refresh_token_is_rejected(token_upstream):
+    calls, statuses = token_upstream
+    statuses.extend([401] * 100)
+
+    async def ask_for_token(manager):
+        with pytest.raises(bridge.AtombergAPIError):
+            await manager.get_token()
+        await asyncio.sleep(0.1)
+
+    run_refresher(0.1, ask_for_token)
+    # One background fetch, then only the one the request made
+    assert calls == ["/get_access_token"] * 2
+    assert quota.usage.used() == 2
+
+def test_paced_write_throttles_reach_the_pacer(token_upstream):
+    calls, statuses = token_upstream
+    statuses.extend([200, 503, 503, 503])
+    pacer = DevicePacer(initial_gap=0.1)
+
+    async def main():
+        with pytest.raises(bridge.AtombergAPIError):
+            await pacer.run("a", lambda: bridge.send_command("a", {"speed": 3}))
+
+    asyncio.run(main())
+    # Token fetch plus a single, unretried write
+    assert calls == ["/get_access_token", "/send_command"]
+    assert pacer.gap("a") == pytest.approx(0.2)
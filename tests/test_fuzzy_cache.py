@@ -0,0 +1,30 @@
+import pytest
+from fuzzy_cache import FuzzyPlanIndex, is_relative_query
+
+PLAN = [{"function": "get_devices"}, {"function": "send_command", "params": {"device_id": "d1", "command": {"speed": 3}}}]
+
+def test_misspelt_repeat_is_served():
+    index = FuzzyPlanIndex()
+    index.put("pankhe ki speed 3 karo", PLAN)
+    assert index.get("pankhe ki speeed 3 karo") == PLAN
+
+def test_different_slots_are_not_served():
+    index = FuzzyPlanIndex()
+    index.put("pankhe ki speed 3 karo", PLAN)
+    assert index.get("pankhe ki speed 4 karo") is None
+
+@pytest.mark.parametrize("query", ["speed badhao", "speed thoda kam karo", "increase the speed", "speeed badao", "brightness aur badhao"])
+def test_relative_queries_are_detected(query):
+    assert is_relative_query(query)
+
+@pytest.mark.parametrize("query", ["speed 3 karo", "fan band karo", "light warm mode karo"])
+def test_absolute_queries_are_not_relative(query):
+    assert not is_relative_query(query)
+
+def test_relative_queries_are_never_stored_or_served():
+    index = FuzzyPlanIndex()
+    index.put("speed badhao", PLAN)
+    assert len(index) == 0
+    index.put("speed karo", PLAN)
+    assert index.get("speed badhao karo") is None
+    assert index.get("speeed karo") == PLAN
@@ -0,0 +1,54 @@
+import pytest
+from intent import parse_intent
+
+DEVICE = "d1"
+
+def commands(plan: list) -> list:
+    return [step["params"]["command"] for step in plan if step["function"] == "send_command"]
+
+@pytest.mark.parametrize("query, expected", [
+    ("fan band karo", [{"power": False}]),
+    ("turn on the fan light", [{"led": True}]),
+    ("fan ki light on karo", [{"led": True}]),
+    ("timer 2 ghante lagao", [{"timer": 2}]),
+    ("sleep mode on karo", [{"sleep": True}]),
+    ("pankhe ki speed 3 karo", [{"power": True}, {"speed": 3}]),
+    ("set brightness to 60", [{"led": True}, {"brightness": 60}]),
+    ("light warm mode karo", [{"led": True}, {"light_mode": "warm"}]),
+    ("pankha bnd kro", [{"power": False}])
+])
+def test_simple_commands(query, expected):
+    plan = parse_intent(query, DEVICE)
+    assert plan[0] == {"function": "get_devices"}
+    assert commands(plan) == expected
+    assert all(step["params"]["device_id"] == DEVICE for step in plan[1:])
+
+def test_adjustments_read_state_first():
+    plan = parse_intent("set speed to 4", DEVICE)
+    assert plan[1] == {"function": "get_device_state", "params": {"device_id": DEVICE}}
+    assert parse_intent("fan band karo", DEVICE)[1]["function"] == "send_command"
+
+def test_clauses_are_split_on_connectors():
+    assert commands(parse_intent("fan on karo aur speed 4 karo", DEVICE)) == [{"power": True}, {"power": True}, {"speed": 4}]
+
+def test_all_devices_become_one_fan_out():
+    assert parse_intent("sab pankhe band karo", DEVICE) == [
+        {"function": "get_devices"},
+        {"function": "send_command_many", "params": {"target": "all", "command": {"power": False}}}
+    ]
+    plan = parse_intent("sab pankhe speed 2 karo", DEVICE)
+    assert plan[-1]["params"]["command"] == {"power": True, "speed": 2}
+
+@pytest.mark.parametrize("query", [
+    "speed badhao",
+    "pankhe ki speed kam karo",
+    "what is the weather",
+    "speed 9 karo",
+    "brightness 5 karo",
+    "timer 7 lagao",
+    "fan on off karo",
+    "speed 3 4 karo",
+    ""
+])
+def test_falls_back_to_the_planner(query):
+    assert parse_intent(query, DEVICE) is None
@@ -0,0 +1,98 @@
+from plan_optimizer import add_preconditions, coalesce_commands, optimize_plan
+
+def write(device_id: str, **command) -> dict:
+    return {"function": "send_command", "params": {"device_id": device_id, "command": command}}
+
+def read(device_id: str) -> dict:
+    return {"function": "get_device_state", "params": {"device_id": device_id}}
+
+def no_state(device_id):
+    return None
+
+def test_coalesce_merges_adjacent_commands_for_one_device():
+    plan = [{"function": "get_devices"}, write("a", power=True), write("a", speed=3), write("a", speed=4, power=True)]
+    coalesced, saved = coalesce_commands(plan)
+    assert saved == 2
+    assert coalesced == [{"function": "get_devices"}, write("a", power=True, speed=4)]
+    assert list(coalesced[1]["params"]["command"]) == ["power", "speed"]
+    # The caller's plan is left untouched
+    assert plan[1] == write("a", power=True)
+
+def test_coalesce_keeps_order_across_other_steps():
+    plan = [write("a", power=True), write("b", power=True), write("a", speed=2), read("a"), write("a", led=True)]
+    assert coalesce_commands(plan) == (plan, 0)
+
+def test_token_step_skipped_only_while_token_is_valid():
+    plan = [{"function": "get_access_token"}, {"function": "get_devices"}]
+    assert optimize_plan(plan, True, no_state) == (plan[1:], [(plan[0], "access token still valid")])
+    assert optimize_plan(plan, False, no_state) == (plan, [])
+
+def test_repeated_device_list_is_skipped():
+    plan = [{"function": "get_devices"}, {"function": "get_devices"}]
+    assert optimize_plan(plan, False, no_state) == (plan[:1], [(plan[1], "device list already fetched")])
+
+def test_repeated_read_skipped_until_a_write_to_the_device():
+    plan = [read("a"), read("a"), write("a", power=True), read("a"), read("b")]
+    optimized, skipped = optimize_plan(plan, False, no_state)
+    assert optimized == [read("a"), write("a", power=True), read("a"), read("b")]
+    assert skipped == [(read("a"), "state already read")]
+
+def test_fan_out_makes_reads_necessary_again():
+    fan_out = {"function": "send_command_many", "params": {"target": "all", "command": {"power": False}}}
+    plan = [read("a"), fan_out, read("a")]
+    assert optimize_plan(plan, False, no_state) == (plan, [])
+
+def test_commands_already_in_effect_are_dropped():
+    state = {"power": True, "last_recorded_speed": 3, "led": False, "last_recorded_brightness": 50}
+    plan = [write("a", power=True, speed=3, brightness=50)]
+    optimized, skipped = optimize_plan(plan, False, lambda device_id: state)
+    # Brightness only counts as set while the light is on
+    assert optimized == [write("a", brightness=50)]
+    assert skipped == [(write("a", power=True, speed=3), "already set")]
+
+def test_fully_redundant_command_is_removed():
+    state = {"power": False, "last_recorded_speed": 3}
+    optimized, skipped = optimize_plan([write("a", power=False)], False, lambda device_id: state)
+    assert optimized == []
+    assert skipped == [(write("a", power=False), "already set")]
+
+def test_speed_is_not_noop_while_fan_is_off():
+    state = {"power": False, "last_recorded_speed": 3}
+    plan = [write("a", speed=3)]
+    assert optimize_plan(plan, False, lambda device_id: state) == (plan, [])
+
+def test_state_follows_earlier_commands_in_the_plan():
+    state = {"power": False}
+    plan = [write("a", power=True), read("b"), write("a", power=True)]
+    optimized, skipped = optimize_plan(plan, False, lambda device_id: state)
+    assert optimized == plan[:2]
+    assert skipped == [(write("a", power=True), "already set")]
+    # The cached state itself is not modified
+    assert state == {"power": False}
+
+def test_unknown_devices_are_sent_as_planned():
+    plan = [write("a", power=True)]
+    assert optimize_plan(plan, False, no_state) == (plan, [])
+
+def test_preconditions_are_added_to_commands_that_need_them():
+    plan = [{"function": "get_devices"}, write("a", speed=5), write("a", brightness=60)]
+    assert add_preconditions(plan) == [{"function": "get_devices"}, write("a", power=True, speed=5), write("a", led=True, brightness=60)]
+    assert list(add_preconditions(plan)[1]["params"]["command"]) == ["power", "speed"]
+    # The caller's plan is left untouched
+    assert plan[1] == write("a", speed=5)
+
+def test_preconditions_respect_what_the_plan_already_sets():
+    plan = [write("a", power=True), write("a", speed=5), write("b", power=False), write("b", speed=2), write("a", timer=2)]
+    assert add_preconditions(plan) == plan
+    fan_out = {"function": "send_command_many", "params": {"target": "all", "command": {"light_mode": "warm"}}}
+    assert add_preconditions([fan_out])[0]["params"]["command"] == {"led": True, "light_mode": "warm"}
+
+def test_added_preconditions_are_dropped_when_already_on():
+    state = {"power": True, "last_recorded_speed": 3}
+    plan = add_preconditions([write("a", speed=5)])
+    optimized, skipped = optimize_plan(plan, False, lambda device_id: state)
+    assert optimized == [write("a", speed=5)]
+    assert skipped == [(write("a", power=True), "already set")]
+    # With the fan off, the same cached plan turns it on first
+    optimized, _ = optimize_plan(plan, False, lambda device_id: {"power": False})
+    assert optimized == [write("a", power=True, speed=5)]
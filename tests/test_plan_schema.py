@@ -0,0 +1,54 @@
+import pytest
+from intent import DEFAULT_DEVICE_ID
+from plan_schema import extract_plan, normalize_command
+
+PLAN = [
+    {"function": "get_devices"},
+    {"function": "send_command", "params": {"device_id": "d1", "command": {"power": True}}}
+]
+
+@pytest.mark.parametrize("text", [
+    '[{"function": "get_devices"}, {"function": "send_command", "params": {"device_id": "d1", "command": {"power": true}}}]',
+    'Here is the plan:\n```json\n[{"function": "get_devices"}, {"function": "send_command", "params": {"device_id": "d1", "command": {"power": true}}}]\n```\nDone.',
+    'Sure! [{"function": "get_devices"}, {"function": "send_command", "params": {"device_id": "d1", "command": {"power": true}}}] Hope that helps.',
+    '''[
+        // list devices first
+        {"function": "get_devices",},
+        /* then turn it on */
+        {"function": "send_command", "params": {"device_id": "d1", "command": {"power": true,},},},
+    ]''',
+    "[{'function': 'get_devices'}, {'function': 'send_command', 'params': {'device_id': 'd1', 'command': {'power': True}}}]",
+    '{"steps": [{"function": "get_devices", "params": {}}, {"function": "send_command", "params": {"device_id": "d1", "command": {"power": true, "speed": null}}}]}',
+    '[{"name": "get_devices()"}, {"name": "send_command", "arguments": "{\\"device_id\\": \\"d1\\", \\"command\\": {\\"power\\": \\"on\\"}}"}]'
+])
+def test_extract_plan_repairs_planner_output(text):
+    assert extract_plan(text) == PLAN
+
+def test_comment_markers_inside_strings_are_kept():
+    plan = extract_plan('[{"function": "get_device_state", "params": {"device_id": "a#b//c"}}]')
+    assert plan == [{"function": "get_device_state", "params": {"device_id": "a#b//c"}}]
+
+def test_extract_plan_drops_unknown_functions_and_empty_commands():
+    text = '[{"function": "get_devices"}, {"function": "reboot_fan"}, {"function": "send_command", "params": {"device_id": "d1", "command": {"colour": "red"}}}]'
+    assert extract_plan(text) == [{"function": "get_devices"}]
+
+def test_send_command_without_device_uses_the_default():
+    plan = extract_plan('[{"function": "send_command", "params": {"command": {"power": false}}}]')
+    assert plan == [{"function": "send_command", "params": {"device_id": DEFAULT_DEVICE_ID, "command": {"power": False}}}]
+
+@pytest.mark.parametrize("text", [None, "", "I cannot help with that.", "[]", '[{"function": "reboot_fan"}]', "[{"])
+def test_extract_plan_returns_none_when_nothing_is_recoverable(text):
+    assert extract_plan(text) is None
+
+def test_normalize_command_clamps_ranges():
+    assert normalize_command({"speed": 9, "timer": -1, "brightness": 5}) == {"speed": 6, "timer": 0, "brightness": 10}
+    assert normalize_command({"speed": "3", "timer": 2.7, "brightness": "150"}) == {"speed": 3, "timer": 2, "brightness": 100}
+
+def test_normalize_command_coerces_booleans_and_modes():
+    assert normalize_command({"power": "on", "sleep": 0, "led": "False", "light_mode": " Warm "}) == {
+        "power": True, "sleep": False, "led": False, "light_mode": "warm"
+    }
+
+def test_normalize_command_drops_invalid_values():
+    command = {"power": "maybe", "speed": True, "timer": "soon", "light_mode": "purple", "colour": "red", "led": None}
+    assert normalize_command(command) == {}
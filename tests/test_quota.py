@@ -0,0 +1,53 @@
+import json
+import time
+from datetime import datetime
+import quota
+from quota import UsageCounter
+
+def today() -> str:
+    return datetime.today().strftime("%Y-%m-%d")
+
+def test_try_consume_stops_at_threshold():
+    counter = UsageCounter("usage.json", threshold=3)
+    assert [counter.try_consume() for _ in range(4)] == [True, True, True, False]
+    assert counter.used() == 3
+    assert counter.try_consume(2) is False
+
+def test_loads_todays_count_and_ignores_old_days(tmp_path):
+    (tmp_path / "usage.json").write_text(json.dumps({"date": today(), "count": 5}))
+    assert UsageCounter("usage.json").used() == 5
+    (tmp_path / "usage.json").write_text(json.dumps({"date": "2000-01-01", "count": 5}))
+    assert UsageCounter("usage.json").used() == 0
+
+def test_count_resets_at_midnight(tmp_path):
+    counter = UsageCounter("usage.json", threshold=2)
+    assert counter.try_consume(2)
+    assert not counter.try_consume()
+    counter.date = "2000-01-01"
+    counter._rollover_at = time.time() - 1
+    assert counter.try_consume()
+    assert counter.used() == 1
+    assert counter.date == today()
+    assert counter._rollover_at > time.time()
+    counter.flush()
+    assert json.loads((tmp_path / "usage.json").read_text()) == {"date": today(), "count": 1}
+
+def test_flush_batches_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(quota, "FLUSH_BATCH", 3)
+    counter = UsageCounter("usage.json")
+    counter.try_consume()
+    counter.try_consume()
+    assert not (tmp_path / "usage.json").exists()
+    counter.try_consume()
+    assert json.loads((tmp_path / "usage.json").read_text()) == {"date": today(), "count": 3}
+    counter.try_consume()
+    counter.flush()
+    assert json.loads((tmp_path / "usage.json").read_text())["count"] == 4
+    assert not (tmp_path / "usage.json.tmp").exists()
+
+def test_refusals_are_counted(monkeypatch):
+    monkeypatch.setattr(quota, "usage", UsageCounter("usage.json", threshold=1))
+    before = quota.quota_refused_total._values.get((), 0)
+    assert quota.try_consume_quota()
+    assert not quota.try_consume_quota()
+    assert quota.quota_refused_total._values[()] == before + 1
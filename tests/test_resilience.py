@@ -0,0 +1,132 @@
+import httpx
+import pytest
+import resilience
+from resilience import CircuitBreaker, HedgePolicy, RetryPolicy
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+def response(status: int, **headers) -> httpx.Response:
+    return httpx.Response(status, headers=headers)
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    breaker.record(response(500))
+    breaker.record(response(503))
+    breaker.record(response(200))
+    assert breaker.state == CircuitBreaker.CLOSED
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record(httpx.ConnectError("down"))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+def test_client_errors_do_not_count_against_the_upstream(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record(response(404))
+    breaker.record(response(429))
+    breaker.record(ValueError("bad payload"))
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(response(200))
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+def test_failed_probe_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record(response(502))
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 9
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+def test_lost_probe_expires(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    clock.now += 5
+    assert not breaker.allow()
+    clock.now += 5
+    assert breaker.allow()
+
+@pytest.mark.parametrize("outcome, idempotent, retryable", [
+    (response(503), True, True),
+    (response(503), False, False),
+    (response(400), True, False),
+    (response(429), False, True),
+    (httpx.ConnectError("refused"), False, True),
+    (httpx.ReadTimeout("slow"), True, True),
+    (httpx.ReadTimeout("slow"), False, False),
+    (ValueError("bad payload"), True, False)
+])
+def test_retry_depends_on_idempotency(outcome, idempotent, retryable):
+    assert RetryPolicy().is_retryable(outcome, idempotent) is retryable
+
+@pytest.mark.parametrize("outcome", [response(429), response(503), httpx.ReadTimeout("slow"), httpx.ConnectTimeout("slow")])
+def test_paced_callers_see_throttles(outcome):
+    policy = RetryPolicy()
+    assert policy.is_retryable(outcome, True)
+    assert not policy.is_retryable(outcome, True, retry_throttled=False)
+    assert policy.next_delay(0, 0.0, outcome, True, retry_throttled=False) is None
+
+def test_paced_callers_still_retry_other_failures():
+    policy = RetryPolicy()
+    assert policy.is_retryable(httpx.ConnectError("refused"), False, retry_throttled=False)
+    assert policy.is_retryable(response(502), True, retry_throttled=False)
+
+def test_next_delay_is_bounded(clock):
+    policy = RetryPolicy(attempts=2, base_delay=0.2, max_delay=1.0, deadline=5.0)
+    started = clock.now
+    for attempt in range(2):
+        delay = policy.next_delay(attempt, started, response(503), True)
+        assert 0 <= delay <= 0.2 * 2 ** attempt
+    assert policy.next_delay(2, started, response(503), True) is None
+    clock.now += 5
+    assert policy.next_delay(0, started, response(503), True) is None
+
+def test_retry_after_is_honoured_up_to_the_cap():
+    policy = RetryPolicy(base_delay=0.01, max_delay=1.0)
+    assert policy.delay(0, response(429, **{"Retry-After": "0.5"})) >= 0.5
+    assert policy.delay(0, response(429, **{"Retry-After": "30"})) <= 1.0
+    assert policy.delay(0, response(429, **{"Retry-After": "soon"})) <= 0.01
+
+def test_hedge_delay_waits_for_enough_samples():
+    policy = HedgePolicy(enabled=True, percentile=90, min_samples=10, min_delay=0.05)
+    for i in range(9):
+        policy.record(i / 10)
+    assert policy.delay() is None
+    policy.record(0.9)
+    assert policy.delay() == pytest.approx(0.8)
+    assert HedgePolicy(enabled=False, min_samples=0).delay() is None
+
+def test_hedge_budget_limits_hedges():
+    policy = HedgePolicy(enabled=True, max_ratio=0.5, burst=2)
+    assert policy.try_acquire()
+    assert policy.try_acquire()
+    assert not policy.try_acquire()
+    policy.delay()
+    policy.delay()
+    assert policy.try_acquire()
@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+from scheduler import run_plan, step_dependencies
+
+def read(device_id: str) -> dict:
+    return {"function": "get_device_state", "params": {"device_id": device_id}}
+
+def write(device_id: str, **command) -> dict:
+    return {"function": "send_command", "params": {"device_id": device_id, "command": command}}
+
+def collect(plan: list, execute, **kwargs) -> list:
+    async def main():
+        return [item async for item in run_plan(plan, execute, **kwargs)]
+    return asyncio.run(main())
+
+def test_dependencies_keep_per_device_order():
+    plan = [{"function": "get_devices"}, read("a"), read("b"), write("a", power=True), read("a"), write("b", speed=2)]
+    assert step_dependencies(plan) == [set(), set(), set(), {1}, {3}, {2}]
+
+def test_fan_out_conflicts_with_every_device():
+    plan = [write("a", power=True), {"function": "send_command_many", "params": {"target": "all", "command": {"power": False}}}, read("b")]
+    assert step_dependencies(plan) == [set(), {0}, {1}]
+
+def test_results_are_yielded_in_plan_order():
+    delays = {"a": 0.03, "b": 0.0, "c": 0.01}
+
+    async def execute(step):
+        await asyncio.sleep(delays[step["params"]["device_id"]])
+        return step["params"]["device_id"]
+
+    plan = [read("a"), read("b"), read("c")]
+    assert collect(plan, execute) == [(0, "a", None), (1, "b", None), (2, "c", None)]
+
+def test_independent_steps_overlap_and_same_device_steps_do_not():
+    running, peak, order = set(), [0], []
+
+    async def execute(step):
+        device = step["params"]["device_id"]
+        assert device not in running
+        running.add(device)
+        peak[0] = max(peak[0], len(running))
+        await asyncio.sleep(0.01)
+        running.discard(device)
+        order.append((device, step["function"]))
+
+    plan = [write("a", power=True), write("b", power=True), write("a", speed=3), read("a")]
+    collect(plan, execute)
+    assert peak[0] == 2
+    assert [item for item in order if item[0] == "a"] == [("a", "send_command"), ("a", "send_command"), ("a", "get_device_state")]
+
+def test_max_parallel_bounds_concurrency():
+    running, peak = [0], [0]
+
+    async def execute(step):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    collect([read(str(i)) for i in range(6)], execute, max_parallel=2)
+    assert peak[0] == 2
+
+def test_failure_stops_new_steps_but_reports_writes_in_flight():
+    executed = []
+
+    async def execute(step):
+        device = step["params"]["device_id"]
+        executed.append(device)
+        if device == "a":
+            await asyncio.sleep(0.005)
+            raise RuntimeError("boom")
+        await asyncio.sleep(0.02)
+        return device
+
+    # "b" is in flight when "a" fails; the second "a" write is never started
+    plan = [write("a", power=True), write("b", power=True), write("a", speed=2)]
+    items = collect(plan, execute)
+    assert executed == ["a", "b"]
+    assert items[0][0] == 0 and isinstance(items[0][2], RuntimeError)
+    assert items[1] == (1, "b", None)
+    assert len(items) == 2
+
+def test_closing_the_consumer_lets_running_writes_finish():
+    finished = []
+
+    async def execute(step):
+        await asyncio.sleep(0.02)
+        finished.append(step["params"]["device_id"])
+
+    async def main():
+        steps = run_plan([write("a", power=True), write("b", power=True), write("a", speed=2)], execute)
+        await steps.__anext__()
+        await steps.aclose()
+
+    asyncio.run(main())
+    assert sorted(finished) == ["a", "b"]
+
+def test_cancelling_the_consumer_does_not_cancel_a_write():
+    finished = []
+
+    async def execute(step):
+        await asyncio.sleep(0.05)
+        finished.append(step["params"]["device_id"])
+
+    async def consume():
+        async for _ in run_plan([write("a", power=True)], execute):
+            pass
+
+    async def main():
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        consumer.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await consumer
+
+    asyncio.run(main())
+    assert finished == ["a"]
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+import bridge
+import quota
+import registry
+import server
+from quota import UsageCounter
+from resilience import CircuitBreaker
+
+DEVICES = [{"device_id": "a", "room": "Bedroom"}, {"device_id": "b", "room": "Hall"}, {"device_id": "c", "room": "Hall"}]
+
+@pytest.fixture
+def cloud(monkeypatch):
+    """A fake Atomberg cloud with three fans; returns the paths it was called with"""
+    calls = []
+
+    def handler(request):
+        path = request.url.path
+        calls.append(path)
+        if path == "/get_access_token":
+            return httpx.Response(200, json={"message": {"access_token": "token"}})
+        if path == "/get_list_of_devices":
+            return httpx.Response(200, json={"message": {"devices_list": DEVICES}})
+        if path == "/send_command":
+            body = json.loads(request.content)
+            if set(body["command"]) - set(bridge.COMMAND_STATE_FIELDS):
+                return httpx.Response(400, json={"message": "bad command"})
+            return httpx.Response(200, json={"status": "Success"})
+        return httpx.Response(404)
+
+    monkeypatch.setattr(bridge, "_client", httpx.AsyncClient(base_url="http://atomberg.test", transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(bridge, "API_KEY", "key")
+    monkeypatch.setattr(bridge, "REFRESH_TOKEN", "refresh")
+    monkeypatch.setattr(bridge, "circuit_breaker", CircuitBreaker())
+    monkeypatch.setattr(bridge, "token_manager", bridge.TokenManager())
+    monkeypatch.setattr(quota, "usage", UsageCounter("usage.json"))
+    monkeypatch.setattr(registry, "_devices", None)
+    monkeypatch.setattr(registry, "_fetched_at", 0.0)
+    monkeypatch.setattr(registry, "_loaded", True)
+    return calls
+
+@pytest.fixture
+def client():
+    # No lifespan, so no background token refresher
+    return TestClient(server.app)
+
+def test_fan_out_sends_to_every_device(cloud, client):
+    response = client.post("/devices/command", json={"target": "all", "command": {"power": False}})
+    assert response.status_code == 200
+    assert response.json()["succeeded"] == 3
+    assert cloud.count("/send_command") == 3
+
+def test_fan_out_to_a_room(cloud, client):
+    response = client.post("/devices/command", json={"target": {"room": "hall"}, "command": {"speed": 9}})
+    assert sorted(response.json()["devices"]) == ["b", "c"]
+
+@pytest.mark.parametrize("target", ["bedroom", [], {"floor": 1}, {"room": ""}, 3])
+def test_fan_out_rejects_malformed_targets(cloud, client, target):
+    response = client.post("/devices/command", json={"target": target, "command": {"power": False}})
+    assert response.status_code == 422
+    assert cloud == []
+
+def test_fan_out_rejects_commands_with_no_valid_keys(cloud, client):
+    response = client.post("/devices/command", json={"target": "all", "command": {"colour": "red"}})
+    assert response.status_code == 422
+    assert response.json() == {"message": "No valid command keys given."}
+    assert cloud == []
+
+def test_fan_out_without_quota_replies_with_a_message(cloud, client):
+    quota.usage.threshold = 0
+    response = client.post("/devices/command", json={"target": "all", "command": {"power": False}})
+    assert response.status_code == 200
+    assert response.json() == {"message": str(quota.QuotaExceeded())}
+    assert cloud == []
+
+def test_fan_out_to_an_unknown_room_is_an_error(cloud, client):
+    response = client.post("/devices/command", json={"target": {"room": "garage"}, "command": {"power": False}})
+    assert response.json() == {"message": "No devices found for target: {'room': 'garage'}"}
+    assert "/send_command" not in cloud
+
+def test_ask_does_not_confirm_a_fan_out_that_reached_no_device(cloud, client):
+    plan = [{"function": "send_command_many", "params": {"target": {"room": "garage"}, "command": {"power": False}}}]
+
+    async def reply():
+        return await server.final_reply(server.ask_events("garage ke pankhe band karo", plan=plan))
+
+    message = asyncio.run(reply())["message"]
+    assert message == "No devices found for target: {'room': 'garage'}"
+    assert "/send_command" not in cloud
@@ -0,0 +1,154 @@
+# tracing.py
+
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Finished traces kept in memory for /debug/traces
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "100"))
+# When set, every finished trace is appended to this file as one line of OTLP JSON
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+SERVICE_NAME = "atomberg-ai"
+
+_current_span = ContextVar("current_span", default=None)
+
+class Span:
+    def __init__(self, name: str, parent: "Span" = None, attributes: dict = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error = None
+        self.children = []
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._started = time.perf_counter()
+        self.duration_ms = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def fail(self, message: str):
+        self.status = "error"
+        self.error = message
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "duration_ms": None if self.duration_ms is None else round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children]
+        }
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, str):
+        return {"stringValue": value}
+    return {"stringValue": json.dumps(value, ensure_ascii=False, default=str)}
+
+def _otlp_span(span: Span) -> dict:
+    return {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "parentSpanId": span.parent.span_id if span.parent is not None else "",
+        "name": span.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": 2, "message": span.error or ""} if span.status == "error" else {"code": 1}
+    }
+
+class Tracer:
+    """In-process tracer; spans nest through a context variable, so concurrent
+    requests and the tasks they spawn each build their own tree.
+
+    Finished root spans are kept in a ring buffer of `max_traces` and, when
+    `export_path` is set, appended to it as OTLP/JSON (one ExportTraceServiceRequest
+    per line) for loading into any OpenTelemetry-compatible backend.
+    """
+
+    def __init__(self, max_traces: int = TRACE_BUFFER_SIZE, export_path: str = TRACE_EXPORT_FILE):
+        self.export_path = export_path
+        self._traces = deque(maxlen=max_traces)
+        self._export_lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        parent = _current_span.get()
+        span = Span(name, parent, attributes)
+        if parent is not None:
+            parent.children.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(str(e) or type(e).__name__)
+            raise
+        finally:
+            span.finish()
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Exited from another context, e.g. an async generator closed by the GC
+                _current_span.set(parent)
+            if parent is None:
+                self._finish_trace(span)
+
+    def set_attribute(self, key: str, value):
+        """Tag the innermost active span, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span.set_attribute(key, value)
+
+    def _finish_trace(self, root: Span):
+        self._traces.append(root)
+        if self.export_path:
+            try:
+                self.export(root)
+            except OSError as e:
+                print(f"[TRACE EXPORT ERROR]: {e}")
+
+    def export(self, root: Span):
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "tracing"},
+                "spans": [_otlp_span(span) for span in root.walk()]
+            }]
+        }]}
+        line = json.dumps(request, ensure_ascii=False)
+        with self._export_lock:
+            with open(self.export_path, 'a') as f:
+                f.write(line + "\n")
+
+    def traces(self, limit: int = None) -> list:
+        """Most recent traces first, as nested span dicts"""
+        roots = list(self._traces)[::-1][:limit]
+        return [{"trace_id": root.trace_id, **root.to_dict()} for root in roots]
+
+tracer = Tracer()